@@ -0,0 +1,266 @@
+import pandas as pd
+import numpy as np
+from datetime import datetime
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+import multiprocessing
+import queue as queue_module
+
+try:
+    import resource
+except ImportError:  # Not available on Windows: peak memory is then not recorded
+    resource = None
+
+import csv_comparison
+
+BENCH_DIR = os.path.expanduser("~/Desktop/compare_2_files_benchmark") # Directory for the generated CSV pairs and the results file
+RESULTS_FILE = "benchmark_results.jsonl" # One JSON record per run and size, appended so runs can be compared over time
+SIZES = [10_000, 100_000, 1_000_000] # Row counts to benchmark; up to 100_000_000 with --streaming (the in-memory phases need the files to fit in memory)
+GENERATOR_SETTINGS = {
+    'columns': 8,              # Compared (non-key) columns: int, float and text columns in turn
+    'key_cardinality': 1.0,    # Distinct keys as a share of the rows (below 1 gives key-based duplicates)
+    'duplicate_rate': 0.01,    # Share of rows repeated as full-row duplicates
+    'mismatch_rate': 0.01,     # Share of target rows with one changed value
+    'missing_rate': 0.01,      # Share of source rows left out of the target (and as many extra rows added)
+    'null_rate': 0.02,         # Share of null values in the compared columns
+    'string_width': 12,        # Characters per text value
+}
+SEED = 42 # Seed of the generator; the same seed and settings always give the same files
+GENERATOR_CHUNK_ROWS = 1_000_000 # Rows generated and written at a time
+
+# ================================================================
+# SYNTHETIC DATA - seeded source/target CSV pairs
+# ================================================================
+# Rows are generated in chunks, each from its own seeded random generator, so large files are written in bounded
+# memory and a chunk always comes out the same. The target is derived from the source chunk: some rows are left
+# out, some are added with new keys, and some get one value changed.
+
+TEXT_ALPHABET = np.array(list("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"))
+
+def random_text(rng, rows, width):
+    """Random text values of a fixed width"""
+    if rows == 0:
+        return np.array([], dtype=object)
+    letters = TEXT_ALPHABET[rng.integers(0, len(TEXT_ALPHABET), size=(rows, width))]
+    return letters.view(f"<U{width}").ravel().astype(object)
+
+def generate_column(rng, kind, rows, settings):
+    """Values of one compared column ('int', 'float' or 'text'), with nulls at the configured rate"""
+    if kind == 'int':
+        values = pd.Series(rng.integers(0, 1_000_000, size=rows), dtype='float64' if settings['null_rate'] else 'int64')
+    elif kind == 'float':
+        values = pd.Series(np.round(rng.normal(50_000, 15_000, size=rows), 2))
+    else:
+        values = pd.Series(random_text(rng, rows, settings['string_width']), dtype=object)
+    if settings['null_rate']:
+        values[rng.random(rows) < settings['null_rate']] = np.nan
+    return values
+
+def column_kinds(settings):
+    """Name and kind of every compared column"""
+    kinds = ['int', 'float', 'text']
+    return [(f"{kinds[i % 3]}_col_{i}", kinds[i % 3]) for i in range(settings['columns'])]
+
+def generate_chunk(seed, chunk, start, rows, total_rows, settings):
+    """Source and target rows for one chunk of the files"""
+    rng = np.random.default_rng([seed, chunk])
+    key_count = max(1, int(total_rows * settings['key_cardinality']))
+    source = pd.DataFrame({'employee_id': np.arange(start, start + rows) % key_count})
+    for name, kind in column_kinds(settings):
+        source[name] = generate_column(rng, kind, rows, settings)
+    
+    # Full-row duplicates repeat the row before them
+    duplicates = np.flatnonzero(rng.random(rows) < settings['duplicate_rate'])
+    duplicates = duplicates[duplicates > 0]
+    source.iloc[duplicates] = source.iloc[duplicates - 1].to_numpy()
+    
+    # Target: leave rows out, change one value in others, and add as many rows with new keys
+    target = source[rng.random(rows) >= settings['missing_rate']].copy()
+    columns = [name for name, _ in column_kinds(settings)]
+    if columns:
+        changed = np.flatnonzero(rng.random(len(target)) < settings['mismatch_rate'])
+        changed_cols = rng.integers(0, len(columns), size=len(changed))
+        for col_index in np.unique(changed_cols):
+            col = columns[col_index]
+            rows_to_change = target.index[changed[changed_cols == col_index]]
+            if target[col].dtype == object:
+                target.loc[rows_to_change, col] = random_text(rng, len(rows_to_change), settings['string_width'])
+            else:
+                target.loc[rows_to_change, col] = target.loc[rows_to_change, col] + 1
+    extra = source.iloc[:rows - len(target)].copy()
+    extra['employee_id'] = extra['employee_id'] + key_count
+    target = pd.concat([target, extra])
+    return source, target
+
+def generate_csv_pair(rows, data_dir=None, settings=None, seed=None, chunk_rows=None):
+    """
+    Write a seeded source/target CSV pair with the given number of source rows;
+    an existing pair with the same rows, settings and seed is reused. Returns the two file paths
+    """
+    if data_dir is None:
+        data_dir = BENCH_DIR
+    if settings is None:
+        settings = GENERATOR_SETTINGS
+    if seed is None:
+        seed = SEED
+    if chunk_rows is None:
+        chunk_rows = GENERATOR_CHUNK_ROWS
+    
+    os.makedirs(data_dir, exist_ok=True)
+    name = hashlib.blake2b(json.dumps([rows, settings, seed, chunk_rows], sort_keys=True).encode(), digest_size=6).hexdigest()
+    source_file = os.path.join(data_dir, f"bench_{rows}_{name}_source.csv")
+    target_file = os.path.join(data_dir, f"bench_{rows}_{name}_target.csv")
+    if os.path.exists(source_file) and os.path.exists(target_file):
+        return source_file, target_file
+    
+    # Write to temporary files first so an interrupted run never leaves a half-written pair to be reused
+    with open(source_file + ".tmp", "w", newline="") as source_out, open(target_file + ".tmp", "w", newline="") as target_out:
+        for chunk, start in enumerate(range(0, rows, chunk_rows)):
+            source, target = generate_chunk(seed, chunk, start, min(chunk_rows, rows - start), rows, settings)
+            source.to_csv(source_out, index=False, header=chunk == 0)
+            target.to_csv(target_out, index=False, header=chunk == 0)
+    os.replace(source_file + ".tmp", source_file)
+    os.replace(target_file + ".tmp", target_file)
+    return source_file, target_file
+
+# ================================================================
+# HARNESS - time the hot paths and record peak memory
+# ================================================================
+# Every size runs in its own process, so the peak RSS of one size is not hidden by a larger one run before it.
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where the resource module is not available)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def timed(phases, name, func, *args, **kwargs):
+    """Run func and record its wall time (seconds) under the phase name"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    phases[name] = round(time.perf_counter() - start, 4)
+    return result
+
+def run_phases(file1, file2, streaming=False):
+    """Time each hot path of the comparison on one file pair; returns the per-phase timings"""
+    key_columns = csv_comparison.KEY_COLUMNS
+    phases = {}
+    if streaming:
+        timed(phases, 'streaming_comparison', csv_comparison.streaming_csv_comparison, file1, file2)
+        return phases
+    
+    df1 = timed(phases, 'read_file1', csv_comparison.parse_csv, file1, **csv_comparison.csv_read_options(file1))
+    df2 = timed(phases, 'read_file2', csv_comparison.parse_csv, file2, **csv_comparison.csv_read_options(file2))
+    common_cols = list(set(df1.columns).intersection(set(df2.columns)))
+    timed(phases, 'profile_columns', lambda: (csv_comparison.profile_columns(df1), csv_comparison.profile_columns(df2)))
+    # The value comparison yields its report lines lazily, so they are consumed inside the timing
+    timed(phases, 'compare_values_with_identification',
+          lambda: list(csv_comparison.compare_values_with_identification(df1, df2, common_cols, key_columns=key_columns)))
+    timed(phases, 'find_duplicates_and_missing', csv_comparison.find_duplicates_and_missing, df1, df2, key_columns=key_columns)
+    del df1, df2
+    timed(phases, 'enhanced_csv_comparison', csv_comparison.enhanced_csv_comparison, file1, file2)
+    return phases
+
+def benchmark_size(rows, settings, seed, data_dir, streaming, queue):
+    """Generate (or reuse) the pair for one size, run the phases and put the result record on the queue"""
+    try:
+        start = time.perf_counter()
+        file1, file2 = generate_csv_pair(rows, data_dir=data_dir, settings=settings, seed=seed)
+        generate_seconds = round(time.perf_counter() - start, 4)
+    
+        start = time.perf_counter()
+        phases = run_phases(file1, file2, streaming=streaming)
+        queue.put({
+            'rows': rows,
+            'wall_seconds': round(time.perf_counter() - start, 4),
+            'generate_seconds': generate_seconds,
+            'peak_rss_mb': peak_rss_mb(),
+            'phases': phases,
+            'file_mb': round((os.path.getsize(file1) + os.path.getsize(file2)) / (1024 * 1024), 1),
+        })
+    except Exception as e:
+        queue.put({'rows': rows, 'error': str(e)})
+
+def run_benchmark(sizes=None, settings=None, seed=None, data_dir=None, streaming=False, results_file=None):
+    """Benchmark every size in its own process and append the result records to the results file"""
+    if sizes is None:
+        sizes = SIZES
+    if settings is None:
+        settings = GENERATOR_SETTINGS
+    if seed is None:
+        seed = SEED
+    if data_dir is None:
+        data_dir = BENCH_DIR
+    if results_file is None:
+        results_file = os.path.join(data_dir, RESULTS_FILE)
+    os.makedirs(data_dir, exist_ok=True)
+    
+    # Shared by every record of this run, so runs can be told apart and compared
+    run_info = {
+        'run': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'mode': 'streaming' if streaming else 'in_memory',
+        'seed': seed,
+        'settings': settings,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+    
+    records = []
+    context = multiprocessing.get_context()
+    for rows in sizes:
+        print(f"Benchmarking {rows} rows...")
+        queue = context.Queue()
+        process = context.Process(target=benchmark_size, args=(rows, settings, seed, data_dir, streaming, queue))
+        process.start()
+        # The record is small, so the process can finish before it is read; a killed process (e.g. out of memory) leaves none
+        process.join()
+        try:
+            record = queue.get(timeout=1)
+        except queue_module.Empty:
+            record = {'rows': rows, 'error': f"benchmark process exited with code {process.exitcode}"}
+        record = dict(run_info, **record)
+        records.append(record)
+        with open(results_file, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    
+        if 'error' in record:
+            print(f"  Error: {record['error']}")
+            continue
+        print(f"  wall={record['wall_seconds']:.2f}s, peak RSS={record['peak_rss_mb']} MB")
+        for phase, seconds in record['phases'].items():
+            print(f"    {phase}: {seconds:.3f}s")
+    
+    print(f"\nBenchmark results have been appended to: {results_file}")
+    return records
+
+def parse_args():
+    """Command line options; defaults come from the configuration at the top of this file"""
+    parser = argparse.ArgumentParser(description="Benchmark csv_comparison on seeded synthetic source/target files")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="row counts to benchmark (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed of the data generator (default: %(default)s)")
+    parser.add_argument("--data-dir", default=BENCH_DIR, help="directory for the generated files and the results")
+    parser.add_argument("--streaming", action="store_true",
+                        help="time streaming_csv_comparison end to end instead of the in-memory phases (for large sizes)")
+    for name, value in GENERATOR_SETTINGS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value,
+                            help=f"generator setting (default: %(default)s)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    settings = {name: getattr(args, name) for name in GENERATOR_SETTINGS}
+    run_benchmark(sizes=args.sizes, settings=settings, seed=args.seed, data_dir=os.path.expanduser(args.data_dir),
+                  streaming=args.streaming)
+
+if __name__ == "__main__":
+    main()
@@ -3,42 +3,291 @@ import numpy as np
 from datetime import datetime
 import os
 import glob
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from functools import partial, wraps
+from contextlib import contextmanager
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: only needed for the parsed-input cache and Parquet/Arrow output
+    pa = None
+    pq = None
+try:
+    import resource
+except ImportError:  # Not available on Windows: the run profile then has no memory figures
+    resource = None
+import pickle
+import shutil
+import tempfile
+import mmap
+import io
+import sys
+from statistics import NormalDist
 
 CSV_DIR = os.path.expanduser("~/Desktop/compare_2_files") # Define the directory where CSV files are located. This is my local directory
 KEY_COLUMNS = ['employee_id'] # Define the key columns according to dataset
+STREAMING_MODE = False # Read both files in chunks instead of loading them whole (for files larger than memory)
+MEMORY_BUDGET_MB = 1024 # Approximate memory (in MB) for the CSV chunks and the per-column checks in streaming mode
+STREAM_COLUMN_STATE_SHARE = 0.25 # Streaming mode: share of MEMORY_BUDGET_MB for the exact distinct values and numeric values of the columns; a column that outgrows its part switches to the sketches of sketch mode
+SPILL_BUCKETS = 0 # Streaming mode: if > 0, spill both files to this many on-disk buckets by key and compare one bucket pair at a time
+SPILL_DIR = None # Directory for the spill buckets (None = the system temp directory); needs roughly the size of both files
+PRESORTED = False # Both files are sorted by KEY_COLUMNS: merge-join them in one chunked pass (stops with an error if they are not sorted); can also be set with --presorted
+WORKERS = 1 # Number of processes for the per-column checks (1 = run serially); can also be set with --workers
+PARSE_CACHE_DIR = None # Directory for cached parsed copies of the input files, e.g. "~/.cache/csv_comparison" (None = no cache; needs pyarrow)
+PARSE_CACHE_MAX_MB = 10240 # Least recently used cached files are removed when the cache grows past this size
+CSV_ENGINE = "c" # CSV parser: "c" (pandas default), "pyarrow" (multithreaded, needs pyarrow), "parallel" (memory-mapped, split over processes) or "python"
+PARSE_WORKERS = None # Processes for the "parallel" engine (None = one per CPU)
+COLUMN_SCHEMA = {} # Declared dtype per column, e.g. {'employee_id': 'int64', 'salary': 'float64'}; these columns skip type inference (integer columns are read as nullable 'Int64', so they may hold nulls)
+COMPARE_COLUMNS = None # Only read and compare these columns (key columns are always read); None = all columns
+REPORT_MAX_ENTRIES = None # Max records listed per report section (the rest is only counted, with a total); None = list all; can also be set with --max-entries
+ECHO_REPORT = True # Print the report to the console as well as writing the results file (--quiet turns it off)
+COLUMNAR_FORMAT = None # Also write value mismatches and error records as "parquet" or "arrow" (IPC) files with typed columns (needs pyarrow); can also be set with --columnar
+SKETCH_MODE = False # Approximate the distinct counts (HyperLogLog) and quantiles (compactor sketch) in constant memory per column; can also be set with --sketch
+HLL_PRECISION = 14 # Sketch mode: 2**HLL_PRECISION registers per column (14 = 16 KB, about 0.8% error on distinct counts)
+QUANTILE_SKETCH_SIZE = 512 # Sketch mode: values kept per level of the quantile sketch (larger = more accurate quartiles)
+QUICK_SAMPLE_RATE = 0.1 # Quick check (--quick): share of the keys that are sampled, picked by key hash so both files sample the same keys
+QUICK_CHECK_MB = 64 # Quick check: files up to this many MB are read whole (larger files are read in evenly spaced blocks)
+QUICK_BLOCK_MB = 16 # Quick check: MB read from a file larger than QUICK_CHECK_MB, spread over its blocks
+QUICK_CHECK_BLOCKS = 64 # Quick check: number of blocks a larger file is sampled in
+QUICK_CONFIDENCE = 0.95 # Quick check: confidence level of the reported intervals
+PROFILE_RUN = False # Record wall time, CPU time, peak memory growth and rows for every phase, saved as JSON next to the results; can also be set with --profile
+INCREMENTAL = False # Save a key index with row digests after each run and report only value changes since the previous run (--incremental)
+
+WORKER_FRAMES = None # DataFrames handed to the worker processes (inherited by fork, so they are not pickled)
+
+def run_column_tasks(func, frames, tasks, workers=None):
+    """
+    Run func(frames, task) for every task and return the results in task order.
+    With workers > 1 the tasks run in a process pool; the workers inherit the frames when the pool is forked,
+    so large column buffers are shared copy-on-write instead of being pickled to every process
+    """
+    if workers is None:
+        workers = WORKERS
+    if workers <= 1 or len(tasks) < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        return [func(frames, task) for task in tasks]
+    
+    global WORKER_FRAMES
+    WORKER_FRAMES = frames
+    try:
+        with multiprocessing.get_context('fork').Pool(min(workers, len(tasks))) as pool:
+            return pool.map(partial(run_worker_task, func), tasks)
+    finally:
+        WORKER_FRAMES = None
+
+def run_worker_task(func, task):
+    """Run one column task inside a worker process on the inherited frames"""
+    return func(WORKER_FRAMES, task)
+
+# ================================================================
+# INSTRUMENTATION - wall time, CPU time, memory and rows per phase
+# ================================================================
+# Phases are the report sections and helpers wrapped in measure_phase (or decorated with @instrumented); nested
+# phases are named by their path, e.g. "value_comparison/find_value_mismatches". Every finished phase becomes a
+# record that is kept for the run profile (while one is being recorded) and passed to the functions in PHASE_HOOKS,
+# e.g. to forward it to a metrics system. Without a run profile or hooks, phases cost nothing to measure.
+# Work done in worker processes is included in the wall time of the phase that started it, not its CPU time.
+
+PHASE_HOOKS = [] # Functions called with every phase record; add them with add_phase_hook
+RUN_PROFILE = None # Phase records of the run being profiled (None = no run profile)
+PHASE_STACK = [] # Names of the phases that are running, outermost first
+
+def add_phase_hook(hook):
+    """Call hook(record) for every finished phase; a record has phase, wall_seconds, cpu_seconds, peak_memory_delta_mb and rows"""
+    PHASE_HOOKS.append(hook)
+
+def peak_memory_mb():
+    """Peak resident memory of this process so far in MB (None where the resource module is not available)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+@contextmanager
+def measure_phase(name, rows=None):
+    """
+    Measure the code in the with block as one phase; yields the phase record,
+    so the block can fill in the rows it processed once it knows them
+    """
+    record = {'phase': "/".join(PHASE_STACK + [name]), 'rows': rows}
+    if RUN_PROFILE is None and not PHASE_HOOKS:
+        yield record
+        return
+    
+    PHASE_STACK.append(name)
+    start_memory = peak_memory_mb()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    try:
+        yield record
+    finally:
+        PHASE_STACK.pop()
+        record['wall_seconds'] = round(time.perf_counter() - start_wall, 6)
+        record['cpu_seconds'] = round(time.process_time() - start_cpu, 6)
+        # How much the phase raised the process's peak memory (0 when it stayed below an earlier peak)
+        record['peak_memory_delta_mb'] = None if start_memory is None else round(peak_memory_mb() - start_memory, 3)
+        if RUN_PROFILE is not None:
+            RUN_PROFILE.append(record)
+        for hook in PHASE_HOOKS:
+            try:
+                hook(record)
+            except Exception as e:
+                print(f"Error in phase hook for {record['phase']}: {str(e)}")
+
+def instrumented(func):
+    """Measure every call of func as a phase named after it; rows are the rows of its DataFrame arguments (or result)"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if RUN_PROFILE is None and not PHASE_HOOKS:
+            return func(*args, **kwargs)
+        rows = sum(len(arg) for arg in list(args) + list(kwargs.values()) if isinstance(arg, pd.DataFrame))
+        with measure_phase(func.__name__, rows=rows) as record:
+            result = func(*args, **kwargs)
+            # Readers have no DataFrame arguments: count the rows they return
+            if not rows and isinstance(result, pd.DataFrame):
+                record['rows'] = len(result)
+            return result
+    return wrapper
+
+def start_run_profile():
+    """Start recording phase records for the run profile"""
+    global RUN_PROFILE
+    RUN_PROFILE = []
+
+def finish_run_profile():
+    """Stop recording and return the phase records of the run"""
+    global RUN_PROFILE
+    records, RUN_PROFILE = RUN_PROFILE or [], None
+    return records
+
+def save_run_profile(records, file_path, file1_path, file2_path):
+    """Write the phase records as a JSON run profile (with a total per phase name)"""
+    totals = {}
+    for record in records:
+        total = totals.setdefault(record['phase'], {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': 0})
+        total['calls'] += 1
+        total['wall_seconds'] = round(total['wall_seconds'] + record['wall_seconds'], 6)
+        total['cpu_seconds'] = round(total['cpu_seconds'] + record['cpu_seconds'], 6)
+        total['rows'] += record['rows'] or 0
+    profile = {
+        'file1': os.path.basename(file1_path),
+        'file2': os.path.basename(file2_path),
+        'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'peak_memory_mb': None if peak_memory_mb() is None else round(peak_memory_mb(), 3),
+        'phases': records,
+        'totals': totals,
+    }
+    with open(file_path, "w") as f:
+        json.dump(profile, f, indent=1, default=float)
 
-def get_record_identifier(row, key_columns=None):
-    """Get The columns used in the duplication analysis:
-    use key columns; if do not exist, use the fallback (first) column; 
-    if not - then take the first non-null column (if nulls exist in the previous columns)"""
+def text_values(values):
+    """Values of a column as the text an f-string gives them row by row (e.g. dates keep their time, float32 its digits)"""
+    return values.astype(object).astype(str)
+
+@instrumented
+def build_record_identifiers(df, key_columns=None):
+    """
+    Identifier text of every row of df, built column-wise: the key columns; if they do not exist, the fallback
+    (first) column; if there is none, the first non-null column
+    """
     # Resolve default key columns
     if key_columns is None:
         key_columns = KEY_COLUMNS
-    try:
-        # First try key columns
-        key_values = [f"{col}={row[col]}" for col in key_columns if col in row]
-        if key_values:
-            return ", ".join(key_values)
-        
-        # Fallback to the first data column (excluding helper columns)
-        helper_cols = {'_merge_key', 'record_identifier', 'source_file', 'error_type', 'num_errors'}
-        for col in row.index:
-            if col not in helper_cols:
-                if pd.notna(row[col]):
-                    return f"{col}={row[col]}"
-                else:
-                    # If first column is null, still use it by name for traceability
-                    return f"{col}={row[col]}"
-        
-        # Lastly, first non-null value in any column
-        for col in row.index:
-            if pd.notna(row[col]):
-                return f"{col}={row[col]}"
-        
-        return "Unknown record" # If no column can be used as a key column
-    except Exception as e:
-        return "Error identifying record"
+    
+    # First try key columns
+    present_keys = [col for col in key_columns if col in df.columns]
+    if present_keys:
+        identifiers = None
+        for col in present_keys:
+            part = f"{col}=" + text_values(df[col])
+            identifiers = part if identifiers is None else identifiers + ", " + part
+        return identifiers
+    
+    # Fallback to the first data column (excluding helper columns), even if it is null
+    helper_cols = {'_merge_key', 'record_identifier', 'source_file', 'error_type', 'num_errors'}
+    data_cols = [col for col in df.columns if col not in helper_cols]
+    if data_cols:
+        return f"{data_cols[0]}=" + text_values(df[data_cols[0]])
+    
+    # Lastly, first non-null value in any column (filled from the last column back so the first one wins)
+    identifiers = pd.Series("Unknown record", index=df.index, dtype=object)
+    for col in reversed(list(df.columns)):
+        identifiers = identifiers.where(df[col].isna(), f"{col}=" + text_values(df[col]))
+    return identifiers
         
+@instrumented
+def encode_keys(df1, df2, key_columns):
+    """
+    Integer code for the key of every row of both files; rows get the same code when all their key values
+    are equal as strings (so NaN keys match each other, as 'nan')
+    """
+    codes = np.zeros(len(df1) + len(df2), dtype=np.int64)
+    for col in key_columns:
+        values = np.concatenate([df1[col].to_numpy().astype(str), df2[col].to_numpy().astype(str)])
+        col_codes, uniques = pd.factorize(values)
+        # Combine with the codes of the previous columns and renumber, so the codes stay below the row count
+        codes, _ = pd.factorize(codes * len(uniques) + col_codes)
+    return codes[:len(df1)], codes[len(df1):]
+
+def group_codes(df, columns, codes=None, has_null=None):
+    """
+    Group code per row over the given columns (NaN equal to NaN, as in df.duplicated), numbered in order of
+    first appearance, and a mask of the rows with a null in any of the columns;
+    codes/has_null of earlier columns are extended with the given columns
+    """
+    codes = np.zeros(len(df), dtype=np.int64) if codes is None else codes
+    has_null = np.zeros(len(df), dtype=bool) if has_null is None else has_null.copy()
+    for col in columns:
+        col_codes, uniques = pd.factorize(df[col])
+        # Nulls get a code of their own, after the values
+        nulls = col_codes == -1
+        has_null |= nulls
+        col_codes = np.where(nulls, len(uniques), col_codes)
+        # Combine with the codes of the previous columns and renumber, so the codes stay below the row count
+        codes, _ = pd.factorize(codes * (len(uniques) + 1) + col_codes)
+    return codes, has_null
+
+def first_rows(codes):
+    """Positions of the first row of every group (codes numbered in order of first appearance), in file order"""
+    if len(codes) == 0:
+        return np.array([], dtype=np.int64)
+    return np.flatnonzero(np.diff(np.maximum.accumulate(codes), prepend=-1) > 0)
+
+@instrumented
+def duplicate_groups(df, key_columns):
+    """
+    One pass over the columns of a file (key columns first) for both kinds of duplicates:
+    positions and counts of the first row of every full-row duplicate group and of every key-based duplicate group.
+    Groups with a null (in any column, or in a key column) are left out, as groupby leaves them out
+    """
+    key_codes, key_has_null = group_codes(df, key_columns)
+    # Full-row codes build on the key codes, so the key columns are only factorized once
+    other_columns = [col for col in df.columns if col not in key_columns]
+    row_codes, row_has_null = group_codes(df, other_columns, key_codes, key_has_null)
+    
+    # Full-row duplicates: the first row of every group that appears more than once
+    row_counts = np.bincount(row_codes, minlength=1)
+    full_dup_mask = row_counts[row_codes] > 1
+    full_positions = first_rows(row_codes)
+    full_positions = full_positions[(row_counts[row_codes[full_positions]] > 1) & ~row_has_null[full_positions]]
+    full_counts = row_counts[row_codes[full_positions]]
+    
+    # Key-based duplicates: rows sharing a key that are not full-row duplicates, counted per key among those rows
+    key_dup_mask = np.bincount(key_codes, minlength=1)[key_codes] > 1
+    candidates = np.flatnonzero(key_dup_mask & ~full_dup_mask & ~key_has_null)
+    candidate_codes, _ = pd.factorize(key_codes[candidates])
+    first_candidates = first_rows(candidate_codes)
+    key_positions = candidates[first_candidates]
+    key_counts = np.bincount(candidate_codes, minlength=1)[candidate_codes[first_candidates]]
+    
+    return full_positions, full_counts, key_positions, key_counts
+
+@instrumented
 def find_duplicates_and_missing(df1, df2, key_columns=None):
     """
     Analyzes the dataframes for duplicates and missing records; 
@@ -48,85 +297,43 @@ def find_duplicates_and_missing(df1, df2, key_columns=None):
     if key_columns is None:
         key_columns = KEY_COLUMNS
     try:
-        # Initialize error tracking DataFrames
-        df1 = df1.copy()
-        df2 = df2.copy()
-        
         # Ensure key columns exist in both dataframes
         for col in key_columns:
             if col not in df1.columns or col not in df2.columns:
                 raise ValueError(f"Key column '{col}' not found in both dataframes")
         
-        # Detect full-row duplicates (all columns identical) in each file
-        full_dup_mask1 = df1.duplicated(keep=False)
-        full_dup_mask2 = df2.duplicated(keep=False)
-        
-        if full_dup_mask1.any():
-            full_dup_counts1 = df1.groupby(list(df1.columns)).size().reset_index(name='num_errors')
-            full_duplicates1 = df1[full_dup_mask1].drop_duplicates().copy()
-            full_duplicates1 = full_duplicates1.merge(full_dup_counts1, on=list(df1.columns))
-        else:
-            full_duplicates1 = df1[full_dup_mask1].copy()
-            full_duplicates1['num_errors'] = 0
-        
-        if full_dup_mask2.any():
-            full_dup_counts2 = df2.groupby(list(df2.columns)).size().reset_index(name='num_errors')
-            full_duplicates2 = df2[full_dup_mask2].drop_duplicates().copy()
-            full_duplicates2 = full_duplicates2.merge(full_dup_counts2, on=list(df2.columns))
-        else:
-            full_duplicates2 = df2[full_dup_mask2].copy()
-            full_duplicates2['num_errors'] = 0
-        
-        # Add source identifier
-        df1['source_file'] = 'file1'
-        df2['source_file'] = 'file2'
-        full_duplicates1['source_file'] = 'file1'
-        full_duplicates2['source_file'] = 'file2'
-        
-        # Mark full duplicates
-        full_duplicates1['error_type'] = 'f'
-        full_duplicates2['error_type'] = 'f'
-        
-        # Find key-based duplicates in each file based on key columns (excluding rows that are full-duplicates)
-        key_dup_mask1 = df1.duplicated(subset=key_columns, keep=False)
-        key_dup_mask2 = df2.duplicated(subset=key_columns, keep=False)
-        duplicates1 = df1[key_dup_mask1 & ~full_dup_mask1].copy()
-        duplicates2 = df2[key_dup_mask2 & ~full_dup_mask2].copy()
-        
-        # Count key-based duplicates and keep unique records by key
-        if not duplicates1.empty:
-            dup_counts1 = duplicates1.groupby(key_columns).size().reset_index(name='num_errors')
-            duplicates1 = duplicates1.drop_duplicates(subset=key_columns, keep='first')
-            duplicates1 = duplicates1.merge(dup_counts1, on=key_columns)
-        else:
-            duplicates1['num_errors'] = 0
-
-        if not duplicates2.empty:
-            dup_counts2 = duplicates2.groupby(key_columns).size().reset_index(name='num_errors')
-            duplicates2 = duplicates2.drop_duplicates(subset=key_columns, keep='first')
-            duplicates2 = duplicates2.merge(dup_counts2, on=key_columns)
-        else:
-            duplicates2['num_errors'] = 0
-        
-        # Mark key-based duplicates
-        duplicates1['error_type'] = 'k'
-        duplicates2['error_type'] = 'k'
-        
-        # Create comparison keys
-        df1_keys = df1[key_columns].apply(lambda x: tuple(x.values.astype(str)), axis=1)
-        df2_keys = df2[key_columns].apply(lambda x: tuple(x.values.astype(str)), axis=1)
+        # Full-row and key-based duplicates of each file in a single pass; only the reported rows are copied
+        frames = {}
+        for name, df in [('file1', df1), ('file2', df2)]:
+            full_positions, full_counts, key_positions, key_counts = duplicate_groups(df, key_columns)
+            
+            # Mark full duplicates (with their occurrence count)
+            full_duplicates = df.iloc[full_positions].reset_index(drop=True)
+            full_duplicates['num_errors'] = full_counts
+            full_duplicates['source_file'] = name
+            full_duplicates['error_type'] = 'f'
+            
+            # Mark key-based duplicates (counted without the rows that are full duplicates)
+            duplicates = df.iloc[key_positions].reset_index(drop=True)
+            duplicates['source_file'] = name
+            duplicates['num_errors'] = key_counts
+            duplicates['error_type'] = 'k'
+            frames[name] = full_duplicates, duplicates
+        full_duplicates1, duplicates1 = frames['file1']
+        full_duplicates2, duplicates2 = frames['file2']
         
-        # Find missing records using sets
-        keys1_set = set(df1_keys)
-        keys2_set = set(df2_keys)
+        # Encode the key of every row as an integer code shared by both files
+        df1_keys, df2_keys = encode_keys(df1, df2, key_columns)
         
         # Get indices of missing and extra records
-        missing_in_2_mask = df1_keys.apply(lambda x: x not in keys2_set) # Marks rows in file 1 whose key does not exist in file 2
-        extra_in_2_mask = df2_keys.apply(lambda x: x not in keys1_set) # Marks rows in file 2 whose key does not exist in file 1 
+        missing_in_2_mask = ~np.isin(df1_keys, df2_keys) # Marks rows in file 1 whose key does not exist in file 2
+        extra_in_2_mask = ~np.isin(df2_keys, df1_keys) # Marks rows in file 2 whose key does not exist in file 1 
         
         # Get missing and extra records
         missing_in_2 = df1[missing_in_2_mask].copy()
         extra_in_2 = df2[extra_in_2_mask].copy()
+        missing_in_2['source_file'] = 'file1'
+        extra_in_2['source_file'] = 'file2'
         
         # Mark missing and extra records with count of 1
         missing_in_2['error_type'] = 'm'  # missing from target
@@ -135,31 +342,28 @@ def find_duplicates_and_missing(df1, df2, key_columns=None):
         extra_in_2['num_errors'] = 1
         
         # Combine all error records (full duplicates, key duplicates, missing records, extra records)
-        error_records = pd.concat([
-            full_duplicates1, full_duplicates2, 
-            duplicates1, duplicates2, 
+        return combine_error_records(
+            full_duplicates1, full_duplicates2,
+            duplicates1, duplicates2,
             missing_in_2, extra_in_2
-        ], ignore_index=True)
-        
-        # Sort by error_type and source_file
-        error_records = error_records.sort_values(['error_type', 'source_file'])
-        
-        return error_records
+        )
         
     except Exception as e:
         print(f"Error in find_duplicates_and_missing: {str(e)}")
         raise
  
-def string_compare(s1, s2):
-    """Compare two string series, and counts how many positions differ between them"""
-    try:
-        # Convert to string (to avoid dtype issues) and reset index
-        s1 = s1.astype(str).reset_index(drop=True)
-        s2 = s2.astype(str).reset_index(drop=True)
-        return (s1 != s2).sum()
-    except Exception as e:
-        print(f"Error in string_compare: {str(e)}")
-        return 0
+def combine_error_records(full_duplicates1, full_duplicates2, duplicates1, duplicates2, missing_in_2, extra_in_2):
+    """Combine the marked error record DataFrames into one, sorted by error_type and source_file"""
+    error_records = pd.concat([
+        full_duplicates1, full_duplicates2, 
+        duplicates1, duplicates2, 
+        missing_in_2, extra_in_2
+    ], ignore_index=True)
+    
+    # Sort by error_type and source_file
+    error_records = error_records.sort_values(['error_type', 'source_file'])
+    
+    return error_records
 
 def compare_column_order(df1, df2):
     """Compare column order between two dataframes and returns a list of column order differences"""
@@ -189,6 +393,25 @@ def get_output_filenames(file1_path, file2_path):
     
     return results_file, errors_file
 
+def get_columnar_filenames(file1_path, file2_path, file_format):
+    """Names of the Parquet/Arrow value mismatch and error record files (based on input file names)"""
+    file1_name = os.path.splitext(os.path.basename(file1_path))[0]
+    file2_name = os.path.splitext(os.path.basename(file2_path))[0]
+    suffix = f"__{file1_name}_vs_{file2_name}.{file_format}"
+    return f"value_mismatches{suffix}", f"error_records{suffix}"
+
+def get_profile_filename(file1_path, file2_path):
+    """Name of the JSON run profile written with --profile (based on input file names)"""
+    file1_name = os.path.splitext(os.path.basename(file1_path))[0]
+    file2_name = os.path.splitext(os.path.basename(file2_path))[0]
+    return f"run_profile__{file1_name}_vs_{file2_name}.json"
+
+def get_state_filename(file1_path, file2_path):
+    """Name of the state file kept between incremental runs (based on input file names)"""
+    file1_name = os.path.splitext(os.path.basename(file1_path))[0]
+    file2_name = os.path.splitext(os.path.basename(file2_path))[0]
+    return f"comparison_state__{file1_name}_vs_{file2_name}.npz"
+
 def get_timestamp_header(file1_path, file2_path):
     """Generate header with timestamp and file information"""
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -202,10 +425,203 @@ def get_timestamp_header(file1_path, file2_path):
     ]
     return "\n".join(header)
 
-def compare_values_with_identification(df1, df2, common_cols, key_columns=None):
-    """Compare values between dataframes and return differences with record identification"""
-    differences = []
+# ================================================================
+# REPORT WRITER - write report lines as they are produced
+# ================================================================
+# A line starting with a newline opens a new report section (e.g. "\n=== VALUE COMPARISON ===" or
+# "\nValue mismatches in column 'x':"); lines starting with "  - " are the section's entries (one per record).
+# Past the entry limit, the rest of a section is counted instead of written, and a total is added at its end.
+
+def open_report(file_path=None, max_section_entries=None, echo=False):
+    """
+    Report sink: lines go to file_path (and to the console with echo) as soon as they are written,
+    or are kept in memory when there is no file_path
+    """
+    if max_section_entries is None:
+        max_section_entries = REPORT_MAX_ENTRIES
+    return {
+        'file': open(file_path, "w") if file_path else None,
+        'lines': None if file_path else [],
+        'echo': echo,
+        'max_entries': max_section_entries,
+        'started': False,
+        'entries': 0,   # entries in the current section
+        'skipped': 0,   # lines of the current section that were not written
+    }
+
+def emit_report_line(report, line):
+    """Write one line to the report outputs (lines are separated by newlines, as with "\\n".join)"""
+    if report['lines'] is not None:
+        report['lines'].append(line)
+    else:
+        report['file'].write(("\n" if report['started'] else "") + line)
+    if report['echo']:
+        print(line)
+    report['started'] = True
+
+def end_report_section(report):
+    """Close the current section: add how many entries were left out, if any"""
+    if report['skipped']:
+        hidden = report['entries'] - report['max_entries']
+        emit_report_line(report, f"  ... {hidden} more entries not shown ({report['entries']} in total)")
+    report['entries'] = 0
+    report['skipped'] = 0
+
+def write_report(report, lines):
+    """Write report lines, truncating each section after the configured number of entries"""
+    for line in lines:
+        if line.startswith("\n"):
+            end_report_section(report)
+        elif line.startswith("  - "):
+            report['entries'] += 1
+        # Continuation lines of an entry that was left out are left out too
+        if report['max_entries'] is not None and report['entries'] > report['max_entries']:
+            report['skipped'] += 1
+            continue
+        emit_report_line(report, line)
+
+def close_report(report):
+    """Finish the report; returns the report text for an in-memory report (None when it was written to a file)"""
+    end_report_section(report)
+    if report['file'] is not None:
+        report['file'].close()
+        return None
+    return "\n".join(report['lines'])
+
+def build_merge_key(df, key_columns):
+    """Build the string key used to match records between the files (key values joined with '_')"""
+    merge_key = df[key_columns[0]].astype(str)
+    for col in key_columns[1:]:
+        merge_key = merge_key + '_' + df[col].astype(str)
+    return merge_key
+
+def row_fingerprints(df, columns, text_columns=()):
+    """
+    64-bit fingerprint per row over the columns (sorted, so column order does not matter); values are hashed
+    in their own dtype, except the text_columns (columns whose dtypes differ between the files), which are
+    hashed in their string form like the value comparison sees them
+    """
+    columns = sorted(columns)
+    if not columns:
+        return np.zeros(len(df), dtype=np.uint64)
+    values = df[columns]
+    if text_columns:
+        values = values.astype({col: str for col in text_columns})
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+def find_column_mismatches(frames, col):
+    """Positions of the merged records whose values differ in one column (compared as strings)"""
+    merged = frames['merged']
+    # Convert to string for comparison to handle different types
+    s1 = merged[f"{col}_1"].astype(str)
+    s2 = merged[f"{col}_2"].astype(str)
+    return np.flatnonzero((s1 != s2).to_numpy())
+
+@instrumented
+def find_value_mismatches(df1, df2, common_cols, key_columns, workers=None, max_entries=None):
+    """
+    Merge the dataframes on the key columns and return the mismatching records per compared column, with their key values;
+    each result keeps the file1 row position ('_file1_row') so results of separate parts can be put back in file order.
+    With max_entries only the first records of each column are kept, and attrs['total_mismatches'] holds their number
+    """
+    # Validate key columns exist
+    for col in key_columns:
+        if col not in df1.columns or col not in df2.columns:
+            raise ValueError(f"Key column '{col}' not found in both dataframes")
+    
+    # Compare values for each common column (skip key columns as they were used for merging)
+    compared_cols = [col for col in common_cols if col not in key_columns]
+    
+    # Match records on the merge key using only the key and a fingerprint of the compared values; columns of the
+    # same dtype in both files are fingerprinted natively, the others by their string form
+    text_columns = [col for col in compared_cols if df1[col].dtype != df2[col].dtype]
+    matches1 = pd.DataFrame({
+        '_merge_key': build_merge_key(df1, key_columns).to_numpy(),
+        '_fingerprint': row_fingerprints(df1, compared_cols, text_columns),
+        '_file1_row': np.arange(len(df1)),
+    })
+    matches2 = pd.DataFrame({
+        '_merge_key': build_merge_key(df2, key_columns).to_numpy(),
+        '_fingerprint': row_fingerprints(df2, compared_cols, text_columns),
+        '_file2_row': np.arange(len(df2)),
+    })
+    matched = pd.merge(matches1, matches2, on='_merge_key', suffixes=('_1', '_2'))
     
+    # Remove duplicate rows based on merge key
+    matched = matched.drop_duplicates(subset=['_merge_key'])
+    
+    # Identical records are skipped; only records whose fingerprints differ are compared column by column
+    matched = matched[matched['_fingerprint_1'] != matched['_fingerprint_2']]
+    file1_rows = matched['_file1_row'].to_numpy()
+    file2_rows = matched['_file2_row'].to_numpy()
+    merged = pd.concat([
+        df1.iloc[file1_rows][compared_cols].add_suffix('_1').reset_index(drop=True),
+        df2.iloc[file2_rows][compared_cols].add_suffix('_2').reset_index(drop=True),
+    ], axis=1)
+    merged['_file1_row'] = file1_rows
+    
+    positions = run_column_tasks(find_column_mismatches, {'merged': merged}, compared_cols, workers)
+    
+    mismatches = {}
+    totals = {}
+    for col, mismatch_positions in zip(compared_cols, positions):
+        if len(mismatch_positions):
+            mismatches[col] = merged.iloc[mismatch_positions[:max_entries]][['_file1_row', f"{col}_1", f"{col}_2"]]
+            totals[col] = len(mismatch_positions)
+    
+    # Record identifiers are only built for the file1 records that are reported
+    if mismatches:
+        reported_rows = np.unique(np.concatenate([m['_file1_row'].to_numpy() for m in mismatches.values()]))
+        identifiers = pd.Series(build_record_identifiers(df1.iloc[reported_rows], key_columns=key_columns).to_numpy(),
+                                index=reported_rows)
+        key_values = df1.iloc[reported_rows][key_columns].set_axis(reported_rows)
+        for col, mismatch_records in mismatches.items():
+            mismatch_records = mismatch_records.copy()
+            mismatch_records.insert(1, 'record_identifier_1', identifiers.loc[mismatch_records['_file1_row']].to_numpy())
+            for position, key_col in enumerate(key_columns, start=2):
+                mismatch_records.insert(position, key_col, key_values[key_col].loc[mismatch_records['_file1_row']].to_numpy())
+            mismatch_records.attrs['total_mismatches'] = totals[col]
+            mismatches[col] = mismatch_records
+    
+    return mismatches
+
+def is_text_column(df1, df2, col):
+    """Check if the column is string/object type in original dataframes (text values are shown quoted)"""
+    return (df1[col].dtype == 'object' or 
+            df2[col].dtype == 'object' or 
+            'datetime' in str(df1[col].dtype) or 
+            'datetime' in str(df2[col].dtype))
+
+def interleave_lines(*lines):
+    """Merge equally long Series of report lines into one list: the first line of every row, then its second, ..."""
+    return np.column_stack([part.to_numpy(dtype=object) for part in lines]).ravel().tolist()
+
+def format_value_mismatches(mismatches, text_cols, max_entries=None):
+    """
+    Format the mismatching records of each column as Source/Target report lines (generated lazily, column by column);
+    only the first max_entries records of a column are formatted, the rest is counted
+    """
+    if max_entries is None:
+        max_entries = REPORT_MAX_ENTRIES
+    for col, mismatch_records in mismatches.items():
+        total = mismatch_records.attrs.get('total_mismatches', len(mismatch_records))
+        mismatch_records = mismatch_records.iloc[:max_entries]
+        yield f"\nValue mismatches in column '{col}':"
+        # Format values based on type
+        quote = "'" if col in text_cols else ""
+        yield from interleave_lines(
+            "  - " + mismatch_records['record_identifier_1'] + ":",
+            "    Source: " + quote + text_values(mismatch_records[f"{col}_1"]) + quote,
+            "    Target: " + quote + text_values(mismatch_records[f"{col}_2"]) + quote,
+        )
+        if total > len(mismatch_records):
+            yield f"  ... {total - len(mismatch_records)} more entries not shown ({total} in total)"
+
+def compare_values_with_identification(df1, df2, common_cols, key_columns=None, workers=None, mismatch_file=None):
+    """
+    Compare values between dataframes and return differences with record identification;
+    with a mismatch_file the mismatches are also written as a Parquet/Arrow table
+    """
     try:
         # Ensure key_columns is set
         if key_columns is None:
@@ -214,72 +630,13 @@ def compare_values_with_identification(df1, df2, common_cols, key_columns=None):
         if isinstance(key_columns, str):
             key_columns = [key_columns]
         
-        # Validate key columns exist
-        for col in key_columns:
-            if col not in df1.columns or col not in df2.columns:
-                raise ValueError(f"Key column '{col}' not found in both dataframes")
-        
-        # Create a merged dataframe for comparison
-        df1_temp = df1.copy()
-        df2_temp = df2.copy()
-        
-        # Create merge key
-        if len(key_columns) == 1:
-            df1_temp['_merge_key'] = df1_temp[key_columns[0]].astype(str)
-            df2_temp['_merge_key'] = df2_temp[key_columns[0]].astype(str)
-        else:
-            df1_temp['_merge_key'] = df1_temp[key_columns].astype(str).agg('_'.join, axis=1)
-            df2_temp['_merge_key'] = df2_temp[key_columns].astype(str).agg('_'.join, axis=1)
-        
-        # Add record identifiers
-        df1_temp['record_identifier'] = df1_temp.apply(lambda row: get_record_identifier(row, key_columns=key_columns), axis=1)
-        df2_temp['record_identifier'] = df2_temp.apply(lambda row: get_record_identifier(row, key_columns=key_columns), axis=1)
-        
-        # Merge dataframes
-        merged = pd.merge(df1_temp, df2_temp, on='_merge_key', suffixes=('_1', '_2'))
-        
-        # Remove duplicate rows based on merge key
-        merged = merged.drop_duplicates(subset=['_merge_key'])
-        
-        # Compare values for each common column
-        for col in common_cols:
-            if col in key_columns:
-                continue  # Skip key columns as they were used for merging
-                
-            col1 = f"{col}_1"
-            col2 = f"{col}_2"
-            
-            if col1 in merged.columns and col2 in merged.columns:
-                # Convert to string for comparison to handle different types
-                s1 = merged[col1].astype(str)
-                s2 = merged[col2].astype(str)
-                
-                # Find mismatches
-                mismatches = s1 != s2
-                mismatch_records = merged[mismatches]
-                
-                if not mismatch_records.empty:
-                    differences.append(f"\nValue mismatches in column '{col}':")
-                    for _, row in mismatch_records.iterrows():
-                        differences.append(f"  - {row['record_identifier_1']}:")
-                        # Format values based on type
-                        val1 = row[col1]
-                        val2 = row[col2]
-                        
-                        # Check if the column is string/object type in original dataframes
-                        is_text = (df1[col].dtype == 'object' or 
-                                 df2[col].dtype == 'object' or 
-                                 'datetime' in str(df1[col].dtype) or 
-                                 'datetime' in str(df2[col].dtype))
-                        
-                        if is_text:
-                            differences.append(f"    Source: '{val1}'")
-                            differences.append(f"    Target: '{val2}'")
-                        else:
-                            differences.append(f"    Source: {val1}")
-                            differences.append(f"    Target: {val2}")
-        
-        return differences
+        # Without a mismatch file only the records that will be listed are kept
+        max_entries = REPORT_MAX_ENTRIES if mismatch_file is None else None
+        mismatches = find_value_mismatches(df1, df2, common_cols, key_columns, workers=workers, max_entries=max_entries)
+        if mismatch_file is not None:
+            save_value_mismatches(mismatches, key_columns, mismatch_file)
+        text_cols = {col for col in mismatches if is_text_column(df1, df2, col)}
+        return format_value_mismatches(mismatches, text_cols)
         
     except Exception as e:
         print(f"Detailed error in value comparison: {str(e)}")
@@ -288,34 +645,798 @@ def compare_values_with_identification(df1, df2, common_cols, key_columns=None):
         print(f"Debug info - key_columns: {key_columns}")
         return [f"\nError comparing values: {str(e)}"]
 
-def enhanced_csv_comparison(file1_path, file2_path):
+def build_key_index(df, key_columns, compared_cols, text_columns=()):
+    """Sorted merge-key hashes of a file, with the position and row digest of the first record of each key"""
+    key_hashes = pd.util.hash_pandas_object(build_merge_key(df, key_columns), index=False).to_numpy()
+    keys, first_rows = np.unique(key_hashes, return_index=True)
+    digests = row_fingerprints(df.iloc[first_rows], compared_cols, text_columns)
+    return {'keys': keys, 'digests': digests, 'rows': first_rows}
+
+def mismatching_keys(index1, index2):
+    """Keys found in both files whose row digests differ"""
+    common, idx1, idx2 = np.intersect1d(index1['keys'], index2['keys'], assume_unique=True, return_indices=True)
+    return common[index1['digests'][idx1] != index2['digests'][idx2]]
+
+def changed_keys(previous_keys, previous_digests, keys, digests):
+    """Keys that are new, removed, or whose row digest changed since the previous run"""
+    positions = np.clip(np.searchsorted(previous_keys, keys), 0, max(len(previous_keys) - 1, 0))
+    unchanged = np.zeros(len(keys), dtype=bool)
+    if len(previous_keys):
+        unchanged = (previous_keys[positions] == keys) & (previous_digests[positions] == digests)
+    removed = np.setdiff1d(previous_keys, keys, assume_unique=True)
+    return np.union1d(keys[~unchanged], removed)
+
+def load_comparison_state(state_file, meta):
+    """Read the state saved by the previous run; None if there is none or it was made with other settings"""
+    if not os.path.exists(state_file):
+        return None
+    try:
+        with np.load(state_file, allow_pickle=False) as data:
+            state = {name: data[name] for name in data.files}
+        saved_meta = json.loads(str(state.pop('meta')))
+    except Exception as e:
+        print(f"Error reading comparison state {state_file}: {str(e)}")
+        return None
+    
+    created = saved_meta.pop('created', None)
+    if saved_meta != meta:
+        print("Key columns, compared columns or their dtypes changed since the last run; running a full comparison")
+        return None
+    state['created'] = created
+    return state
+
+def save_comparison_state(state_file, meta, index1, index2, mismatch_keys):
+    """Save the key index and row digests of both files, and the mismatching keys, for the next run"""
+    meta = dict(meta, created=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    with open(state_file + ".tmp", "wb") as f:
+        np.savez(f, meta=np.array(json.dumps(meta)),
+                 keys1=index1['keys'], digests1=index1['digests'],
+                 keys2=index2['keys'], digests2=index2['digests'],
+                 mismatch_keys=mismatch_keys)
+    os.replace(state_file + ".tmp", state_file)
+
+@instrumented
+def incremental_value_comparison(df1, df2, common_cols, key_columns, state_file, workers=None, mismatch_file=None):
+    """
+    Value comparison against the state saved by the previous run: only keys whose row digest changed can hold
+    new, changed or resolved mismatches, so only those records are compared and reported.
+    Saves the new state; returns None when there is no usable previous state (the full comparison runs instead).
+    The mismatch_file, if any, gets the new and changed mismatches
+    """
+    compared_cols = sorted(col for col in common_cols if col not in key_columns)
+    # Columns whose dtypes differ between the files are digested by their string form; the digests of
+    # a previous run are only comparable when the same columns were
+    text_columns = [col for col in compared_cols if df1[col].dtype != df2[col].dtype]
+    meta = {'key_columns': list(key_columns), 'compared_columns': compared_cols, 'text_digest_columns': text_columns}
+    index1 = build_key_index(df1, key_columns, compared_cols, text_columns)
+    index2 = build_key_index(df2, key_columns, compared_cols, text_columns)
+    mismatch_keys = mismatching_keys(index1, index2)
+    previous = load_comparison_state(state_file, meta)
+    save_comparison_state(state_file, meta, index1, index2, mismatch_keys)
+    if previous is None:
+        return None
+    
+    changed1 = changed_keys(previous['keys1'], previous['digests1'], index1['keys'], index1['digests'])
+    changed2 = changed_keys(previous['keys2'], previous['digests2'], index2['keys'], index2['digests'])
+    new_mismatches = np.setdiff1d(mismatch_keys, previous['mismatch_keys'], assume_unique=True)
+    # Keys that were already mismatching and changed again in either file
+    changed_mismatches = np.setdiff1d(np.intersect1d(mismatch_keys, np.union1d(changed1, changed2), assume_unique=True),
+                                      new_mismatches, assume_unique=True)
+    resolved = np.setdiff1d(previous['mismatch_keys'], mismatch_keys, assume_unique=True)
+    missing = np.setdiff1d(index1['keys'], index2['keys'], assume_unique=True)
+    extra = np.setdiff1d(index2['keys'], index1['keys'], assume_unique=True)
+    previous_missing = np.setdiff1d(previous['keys1'], previous['keys2'], assume_unique=True)
+    previous_extra = np.setdiff1d(previous['keys2'], previous['keys1'], assume_unique=True)
+    
+    differences = [f"Changes since last run ({previous['created']}):"]
+    differences.append(f"  Keys changed: file1={len(changed1)}, file2={len(changed2)}")
+    differences.append(f"  Mismatching records: {len(mismatch_keys)} (last run: {len(previous['mismatch_keys'])})")
+    differences.append(f"  New mismatches: {len(new_mismatches)}")
+    differences.append(f"  Changed mismatches: {len(changed_mismatches)}")
+    differences.append(f"  Resolved mismatches: {len(resolved)}")
+    differences.append(f"  Missing records in target: {len(missing)} "
+                       f"({len(np.setdiff1d(missing, previous_missing))} new, {len(np.setdiff1d(previous_missing, missing))} resolved)")
+    differences.append(f"  Extra records in target: {len(extra)} "
+                       f"({len(np.setdiff1d(extra, previous_extra))} new, {len(np.setdiff1d(previous_extra, extra))} resolved)")
+    
+    # Details of the new and changed mismatches: only the first record of each of these keys is compared
+    reported = np.union1d(new_mismatches, changed_mismatches)
+    if len(reported):
+        rows1 = np.sort(index1['rows'][np.searchsorted(index1['keys'], reported)])
+        rows2 = np.sort(index2['rows'][np.searchsorted(index2['keys'], reported)])
+        differences.append("\nNew or changed value mismatches since last run:")
+        differences.extend(compare_values_with_identification(df1.iloc[rows1], df2.iloc[rows2], common_cols,
+                                                              key_columns=key_columns, workers=workers,
+                                                              mismatch_file=mismatch_file))
+    elif mismatch_file is not None:
+        save_value_mismatches({}, key_columns, mismatch_file)
+    
+    # Resolved mismatches are identified by their file1 record, when the key is still in file1
+    if len(resolved):
+        still_in_file1 = resolved[np.isin(resolved, index1['keys'])]
+        rows1 = np.sort(index1['rows'][np.searchsorted(index1['keys'], still_in_file1)])
+        differences.append(f"\nResolved value mismatches since last run ({len(resolved)}):")
+        for record_id in build_record_identifiers(df1.iloc[rows1], key_columns=key_columns):
+            differences.append(f"  - {record_id}")
+        if len(still_in_file1) < len(resolved):
+            differences.append(f"  - {len(resolved) - len(still_in_file1)} records no longer in file1")
+    
+    return differences
+
+def duplicate_lines(duplicates):
+    """Report lines for duplicate error records: identifier, source file and number of occurrences"""
+    return ("  - " + build_record_identifiers(duplicates) + " in " + text_values(duplicates['source_file'])
+            + " (appears " + text_values(duplicates['num_errors']) + " times)").tolist()
+
+def record_lines(records):
+    """Report lines for missing/extra error records: their identifiers"""
+    return ("  - " + build_record_identifiers(records)).tolist()
+
+def limited_lines(records, format_lines, max_entries, total=None):
+    """Format only the first max_entries records; the rest (of total records, if more exist than were kept) is counted in a closing line"""
+    if total is None:
+        total = len(records)
+    lines = format_lines(records.iloc[:max_entries])
+    if total > len(lines):
+        lines.append(f"  ... {total - len(lines)} more entries not shown ({total} in total)")
+    return lines
+
+@instrumented
+def error_records_summary(error_records, max_entries=None):
+    """
+    Build the ERROR RECORDS SUMMARY section lines from the combined error records;
+    only the first max_entries records of each error type are formatted, the rest is counted.
+    When only part of the records was kept, attrs['totals'] holds the number of records of each error type
+    """
+    if max_entries is None:
+        max_entries = REPORT_MAX_ENTRIES
+    totals = error_records.attrs.get('totals') or error_records['error_type'].value_counts().to_dict()
+    results = []
+    if not sum(totals.values()):
+        return results
+    
+    results.append("\n=== ERROR RECORDS SUMMARY ===")
+    results.append(f"Total error records found: {sum(totals.values())}")
+    
+    # Count each type of error
+    full_duplicates = error_records[error_records['error_type'] == 'f']
+    duplicates = error_records[error_records['error_type'] == 'k']
+    missing = error_records[error_records['error_type'] == 'm']
+    extra = error_records[error_records['error_type'] == 'e']
+    
+    if totals.get('f'):
+        results.append(f"\nFull-row duplicates ({totals['f']}):")
+        results.extend(limited_lines(full_duplicates, duplicate_lines, max_entries, totals['f']))
+    
+    if totals.get('k'):
+        results.append(f"\nKey-based duplicates ({totals['k']}):")
+        results.extend(limited_lines(duplicates, duplicate_lines, max_entries, totals['k']))
+    
+    if totals.get('m'):
+        results.append(f"\nMissing records in target ({totals['m']}):")
+        results.extend(limited_lines(missing, record_lines, max_entries, totals['m']))
+    
+    if totals.get('e'):
+        results.append(f"\nExtra records in target ({totals['e']}):")
+        results.extend(limited_lines(extra, record_lines, max_entries, totals['e']))
+    
+    return results
+
+# ================================================================
+# COLUMNAR OUTPUT - value mismatches and error records as Parquet / Arrow IPC files
+# ================================================================
+# Value mismatches are written in long format (one row per record and column), next to the error records,
+# so dashboards can load them with their types instead of re-parsing the text report.
+
+def mismatch_values(values):
+    """Values of a compared column as text, keeping nulls as nulls (columns of any type share one table column)"""
+    return values.astype(str).where(values.notna(), None)
+
+def value_mismatch_table(mismatches, key_columns):
+    """Long-format table of the value mismatches: key columns, column, source_value, target_value and error_type ('v')"""
+    pieces = []
+    for col, mismatch_records in mismatches.items():
+        piece = mismatch_records[key_columns].reset_index(drop=True)
+        piece['column'] = col
+        piece['source_value'] = mismatch_values(mismatch_records[f"{col}_1"]).to_numpy()
+        piece['target_value'] = mismatch_values(mismatch_records[f"{col}_2"]).to_numpy()
+        pieces.append(piece)
+    
+    if not pieces:
+        return pd.DataFrame(columns=list(key_columns) + ['column', 'source_value', 'target_value', 'error_type'])
+    table = pd.concat(pieces, ignore_index=True)
+    table['column'] = table['column'].astype('category')
+    table['error_type'] = pd.Categorical(['v'] * len(table))
+    return table
+
+def arrow_table(df):
     """
-    Enhanced comparison of two CSV files with data quality checks:
+    Convert a DataFrame to an Arrow table; object columns that mix numbers and text
+    (e.g. a column that is numeric in one file and text in the other) are stored as text
     """
+    mixed_cols = [col for col in df.columns
+                  if df[col].dtype == 'object' and pd.api.types.infer_dtype(df[col], skipna=True) in ('mixed', 'mixed-integer')]
+    if mixed_cols:
+        df = df.assign(**{col: mismatch_values(df[col]) for col in mixed_cols})
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+def write_columnar(df, file_path):
+    """Write a DataFrame as Parquet (.parquet) or Arrow IPC (.arrow), depending on the file extension"""
+    if pa is None:
+        raise ImportError("pyarrow is required for Parquet/Arrow output")
+    table = arrow_table(df)
+    if file_path.endswith(".parquet"):
+        pq.write_table(table, file_path)
+    else:
+        with pa.OSFile(file_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+@instrumented
+def save_value_mismatches(mismatches, key_columns, file_path):
+    """Write the value mismatch table; a failure is reported but does not stop the comparison"""
     try:
-        # Read CSVs without assuming column order
-        df1 = pd.read_csv(file1_path)
-        df2 = pd.read_csv(file2_path)
+        write_columnar(value_mismatch_table(mismatches, key_columns), file_path)
     except Exception as e:
-        return f"Error reading files: {str(e)}", None
+        print(f"Error writing value mismatches to {file_path}: {str(e)}")
+
+# ================================================================
+# PARSED-INPUT CACHE - reuse the parsed copy of an unchanged CSV file
+# ================================================================
+# Parsed files are stored as uncompressed Arrow IPC files and memory-mapped on re-runs instead of re-parsing the CSV.
+# A cache entry is keyed by the file's content hash plus the parse options; the file's path, size and mtime are
+# kept in the index so an untouched file is found without hashing it again. Least recently used entries are
+# evicted once the cache grows past PARSE_CACHE_MAX_MB.
+
+def file_content_hash(file_path, block_size=8 * 1024 * 1024):
+    """Hash of the file's bytes (blake2b), read in blocks"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_cache_index(cache_dir):
+    """Read the cache index (one entry per cached file); a missing or broken index means an empty cache"""
+    try:
+        with open(os.path.join(cache_dir, "index.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache_index(cache_dir, index):
+    """Write the cache index atomically"""
+    index_file = os.path.join(cache_dir, "index.json")
+    with open(index_file + ".tmp", "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(index_file + ".tmp", index_file)
+
+def evict_cache_entries(cache_dir, index, max_bytes):
+    """Remove least recently used entries until the cache fits in max_bytes"""
+    total_bytes = sum(entry['bytes'] for entry in index.values())
+    for cache_key, entry in sorted(index.items(), key=lambda item: item[1]['last_used']):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, entry['cache_file']))
+        except OSError:
+            pass
+        total_bytes -= entry['bytes']
+        del index[cache_key]
+
+def nullable_dtype(dtype):
+    """Declared integer dtypes as pandas' nullable integers ('int64' -> 'Int64'), so their columns may hold nulls; other dtypes are kept"""
+    try:
+        numpy_dtype = np.dtype(dtype)
+    except TypeError:
+        return dtype
+    if numpy_dtype.kind == 'i':
+        return "Int" + numpy_dtype.name[len("int"):]
+    if numpy_dtype.kind == 'u':
+        return "UInt" + numpy_dtype.name[len("uint"):]
+    return dtype
+
+def csv_read_options(file_path, key_columns=None, engine=None, schema=None, compare_columns=None):
+    """read_csv options for one file: the parser engine, the declared dtypes and the columns to read"""
+    if key_columns is None:
+        key_columns = KEY_COLUMNS
+    if engine is None:
+        engine = CSV_ENGINE
+    if schema is None:
+        schema = COLUMN_SCHEMA
+    if compare_columns is None:
+        compare_columns = COMPARE_COLUMNS
     
-    results = []
+    header = list(pd.read_csv(file_path, nrows=0).columns)
+    options = {}
+    if engine == "pyarrow" and pa is None:
+        print("The pyarrow CSV engine needs pyarrow (pip install pyarrow); using the default parser instead")
+        engine = "c"
+    if engine != "c":
+        options['engine'] = engine
     
-    # Add timestamp and file information header
-    results.append(get_timestamp_header(file1_path, file2_path))
+    # Read only the compared columns plus the key columns (kept in file order)
+    columns = header
+    if compare_columns is not None:
+        wanted = set(compare_columns) | set(key_columns)
+        columns = [col for col in header if col in wanted]
+        options['usecols'] = columns
     
-    # Basic Record Count Check
-    results.append("=== BASIC RECORD COUNT ===")
-    records_match = len(df1) == len(df2)
-    results.append(f"Record Count Check: {'PASS' if records_match else 'FAIL'}")
-    results.append(f"File 1 records: {len(df1)}")
-    results.append(f"File 2 records: {len(df2)}")
+    # Declared dtypes for the columns that are read; the rest are inferred
+    dtypes = {col: nullable_dtype(schema[col]) for col in columns if col in schema}
+    if dtypes:
+        options['dtype'] = dtypes
+    return options
+
+def text_nulls_as_nan(df):
+    """Arrow gives missing text values as None; turn them into NaN like the default parser does"""
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+@instrumented
+def parse_csv(file_path, **read_options):
+    """pd.read_csv with the given options; the Arrow engine's text nulls are normalized to NaN"""
+    if read_options.get('engine') == "parallel":
+        options = {name: value for name, value in read_options.items() if name != 'engine'}
+        # Only files on disk can be memory-mapped
+        if isinstance(file_path, str):
+            return parse_csv_parallel(file_path, **options)
+        return pd.read_csv(file_path, **options)
+    df = pd.read_csv(file_path, **read_options)
+    if read_options.get('engine') == "pyarrow":
+        df = text_nulls_as_nan(df)
+    return df
+
+# ================================================================
+# PARALLEL PARSER - memory-mapped CSV split into byte ranges at record boundaries
+# ================================================================
+# The file is memory-mapped and cut into about one byte range per worker. A cut only lands on a newline outside
+# quotes: the quotes between record starts are counted, and a newline after an odd number of them is inside a
+# quoted field. The forked workers inherit the mapping instead of being sent the file, but each copies its byte
+# range into a BytesIO for the C parser, and its parsed frame is pickled back to the parent, which concatenates the
+# ranges in file order. Ranges that inferred a different dtype than the others are parsed again with the dtype a
+# whole-file read would give (as in streaming mode).
+
+QUOTE = ord('"')
+QUOTE_COUNT_BLOCK = 64 * 1024 * 1024 # Bytes scanned at once while counting quotes (bounds the temporary mask)
+
+def count_quotes(data, start, end):
+    """Number of quote characters in data[start:end], counted block by block"""
+    count = 0
+    for block_start in range(start, end, QUOTE_COUNT_BLOCK):
+        count += np.count_nonzero(data[block_start:min(block_start + QUOTE_COUNT_BLOCK, end)] == QUOTE)
+    return count
+
+def next_record_start(buffer, data, record_start, target):
+    """
+    Start of the first record at or after target, given the start of an earlier record
+    (None when no record starts after target); a newline after an odd number of quotes is inside a field
+    """
+    quotes = count_quotes(data, record_start, target)
+    position = target
+    while True:
+        newline = buffer.find(b"\n", position)
+        if newline == -1:
+            return None
+        quotes += count_quotes(data, position, newline)
+        if quotes % 2 == 0:
+            return newline + 1
+        position = newline + 1
+
+def record_ranges(buffer, data, parts):
+    """Split the data rows (after the header record) into about `parts` byte ranges that start and end on records"""
+    size = len(data)
+    data_start = next_record_start(buffer, data, 0, 0)
+    if data_start is None or data_start >= size:
+        return []
+    starts = [data_start]
+    for part in range(1, parts):
+        target = data_start + (size - data_start) * part // parts
+        if target <= starts[-1]:
+            continue
+        start = next_record_start(buffer, data, starts[-1], target)
+        if start is None or start >= size:
+            break
+        starts.append(start)
+    return list(zip(starts, starts[1:] + [size]))
+
+def parse_byte_range(frames, task):
+    """Parse a copy of one byte range of the memory-mapped file (runs in a worker process; the frame is pickled back)"""
+    start, end, dtypes = task
+    options = dict(frames['options'], dtype=dtypes or frames['options'].get('dtype'))
+    return pd.read_csv(io.BytesIO(frames['buffer'][start:end]), header=None, names=frames['columns'], **options)
+
+def parse_csv_parallel(file_path, workers=None, **read_options):
+    """
+    pd.read_csv(file_path, **read_options) with the file memory-mapped and its byte ranges parsed in parallel
+    processes; gives the same frame as one read_csv of the whole file. The ranges are copied out of the mapping
+    and the parsed pieces are pickled back from the workers, so the gain is parallel parsing, not fewer copies
+    """
+    if workers is None:
+        workers = PARSE_WORKERS or os.cpu_count() or 1
+    columns = list(pd.read_csv(file_path, nrows=0).columns)
+    if os.path.getsize(file_path) == 0 or 'fork' not in multiprocessing.get_all_start_methods():
+        return pd.read_csv(file_path, **read_options)
+    
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        try:
+            ranges = record_ranges(buffer, data, workers)
+        finally:
+            # The array view must be released before the mapping can be closed
+            del data
+        if len(ranges) < 2:
+            return pd.read_csv(file_path, **read_options)
+        
+        frames = {'buffer': buffer, 'columns': columns, 'options': read_options}
+        pieces = run_column_tasks(parse_byte_range, frames, [(start, end, None) for start, end in ranges], workers)
+        
+        # Every range must end up with the dtype a whole-file read gives the column
+        dtypes = {col: unify_chunk_dtypes([piece[col].dtype for piece in pieces]) for col in pieces[0].columns}
+        reparse = [i for i, piece in enumerate(pieces) if any(piece[col].dtype != dtype for col, dtype in dtypes.items())]
+        if reparse:
+            tasks = [(ranges[i][0], ranges[i][1], dtypes) for i in reparse]
+            for i, piece in zip(reparse, run_column_tasks(parse_byte_range, frames, tasks, workers)):
+                pieces[i] = piece
+    return pd.concat(pieces, ignore_index=True)
+
+def read_cached_frame(cache_file):
+    """Memory-map a cached Arrow file back into a DataFrame"""
+    with pa.memory_map(cache_file) as source:
+        return text_nulls_as_nan(pa.ipc.open_file(source).read_all().to_pandas())
+
+@instrumented
+def read_csv_cached(file_path, cache_dir=None, max_mb=None, **read_options):
+    """
+    parse_csv(file_path, **read_options) through the parsed-input cache;
+    without a cache directory (or without pyarrow) the file is simply parsed
+    """
+    if cache_dir is None:
+        cache_dir = PARSE_CACHE_DIR
+    if max_mb is None:
+        max_mb = PARSE_CACHE_MAX_MB
+    if cache_dir is None:
+        return parse_csv(file_path, **read_options)
+    if pa is None:
+        print("Parsed-input cache needs pyarrow (pip install pyarrow); parsing the CSV instead")
+        return parse_csv(file_path, **read_options)
+    
+    cache_dir = os.path.expanduser(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    index = load_cache_index(cache_dir)
+    options_key = json.dumps(read_options, sort_keys=True, default=str)
+    stat = os.stat(file_path)
+    file_info = {'file': os.path.abspath(file_path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    
+    # An untouched file is found by path, size and mtime; otherwise by the hash of its content
+    entry = next((e for e in index.values()
+                  if e['options'] == options_key and all(e[name] == value for name, value in file_info.items())), None)
+    if entry is None:
+        content_hash = file_content_hash(file_path)
+        cache_key = hashlib.blake2b(f"{content_hash}|{options_key}".encode(), digest_size=16).hexdigest()
+        entry = index.get(cache_key)
+    else:
+        cache_key = entry['cache_key']
     
-    # Column Comparison
-    results.append("\n=== COLUMN ANALYSIS ===")
+    if entry is not None and os.path.exists(os.path.join(cache_dir, entry['cache_file'])):
+        try:
+            df = read_cached_frame(os.path.join(cache_dir, entry['cache_file']))
+            entry.update(file_info, last_used=time.time())
+            save_cache_index(cache_dir, index)
+            return df
+        except Exception as e:
+            print(f"Error reading cached copy of {os.path.basename(file_path)}, parsing the CSV instead: {str(e)}")
+    
+    df = parse_csv(file_path, **read_options)
+    try:
+        # Write to a temporary file first so an interrupted run never leaves a broken cache file
+        cache_file = f"{cache_key}.arrow"
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(os.path.join(cache_dir, cache_file + ".tmp"), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(os.path.join(cache_dir, cache_file + ".tmp"), os.path.join(cache_dir, cache_file))
+        
+        index[cache_key] = dict(file_info, cache_key=cache_key, cache_file=cache_file, options=options_key,
+                                bytes=os.path.getsize(os.path.join(cache_dir, cache_file)), last_used=time.time())
+        evict_cache_entries(cache_dir, index, max_mb * 1024 * 1024)
+        save_cache_index(cache_dir, index)
+    except Exception as e:
+        # Columns Arrow can't store (e.g. mixed types) just mean this file isn't cached
+        print(f"Could not cache parsed copy of {os.path.basename(file_path)}: {str(e)}")
+    return df
+
+# ================================================================
+# SKETCHES - approximate distinct counts and quantiles in constant memory
+# ================================================================
+# Sketch mode replaces the exact nunique() and describe() of the profiler (and the hash sets / value lists
+# of streaming mode) by sketches of fixed size:
+#   - HyperLogLog for distinct counts: 2**HLL_PRECISION one-byte registers, relative error about 1.04 / sqrt(registers)
+#   - a compactor sketch for quantiles: levels of at most QUANTILE_SKETCH_SIZE values, each level's values weighing
+#     twice those of the level below; the sketch tracks the variance its compactions add to a rank
+# Both merge (per chunk, per worker) into a sketch of the union; count, mean, std, min and max stay exact.
+
+def new_distinct_sketch(precision=None):
+    """Empty HyperLogLog sketch"""
+    if precision is None:
+        precision = HLL_PRECISION
+    return {'precision': precision, 'registers': np.zeros(2 ** precision, dtype=np.uint8)}
+
+def add_to_distinct_sketch(sketch, hashes):
+    """Add 64-bit value hashes to a HyperLogLog sketch (in place)"""
+    precision = sketch['precision']
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    buckets = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    # Rank = position of the first 1-bit in the remaining bits (frexp gives the bit length exactly below 2**53)
+    rest = (hashes & np.uint64(2 ** (64 - precision) - 1)).astype(np.float64)
+    ranks = (64 - precision + 1 - np.frexp(rest)[1]).astype(np.uint8)
+    np.maximum.at(sketch['registers'], buckets, ranks)
+    return sketch
+
+def merge_distinct_sketches(sketch, other):
+    """Merge another HyperLogLog sketch of the same precision into sketch (in place)"""
+    np.maximum(sketch['registers'], other['registers'], out=sketch['registers'])
+    return sketch
+
+def distinct_estimate(sketch):
+    """Estimated number of distinct values (Ertl's improved estimator: no bias correction tables needed at any count)"""
+    m = len(sketch['registers'])
+    q = 64 - sketch['precision']
+    counts = np.bincount(sketch['registers'], minlength=q + 2).astype(np.float64)
+    
+    # sigma covers the empty registers, tau the saturated ones
+    x = counts[0] / m
+    if x == 1:
+        sigma = np.inf
+    else:
+        y, z = 1.0, x
+        while True:
+            x *= x
+            previous, z = z, z + x * y
+            y += y
+            if z == previous:
+                break
+        sigma = z
+    x = 1 - counts[q + 1] / m
+    tau = 0.0
+    if 0 < x < 1:
+        y, z = 1.0, 1 - x
+        while True:
+            x = np.sqrt(x)
+            previous = z
+            y *= 0.5
+            z -= (1 - x) ** 2 * y
+            if z == previous:
+                break
+        tau = z / 3
+    
+    denominator = m * tau
+    for k in range(q, 0, -1):
+        denominator = 0.5 * (denominator + counts[k])
+    denominator += m * sigma
+    return int(round(m * m / (2 * np.log(2)) / denominator))
+
+def distinct_error(sketch):
+    """Relative standard error of the distinct count estimate"""
+    return 1.04 / np.sqrt(len(sketch['registers']))
+
+def new_quantile_sketch(size=None):
+    """Empty quantile sketch, with the exact moments and extremes of the values added"""
+    if size is None:
+        size = QUANTILE_SKETCH_SIZE
+    return {'size': size, 'levels': [], 'variance': 0.0, 'seed': 0,
+            'count': 0, 'mean': 0.0, 'm2': 0.0, 'min': np.nan, 'max': np.nan}
+
+def merge_moments(sketch, count, mean, m2, low, high):
+    """Combine running count/mean/sum of squared deviations (Chan et al.) and the extremes (in place)"""
+    if count == 0:
+        return
+    total = sketch['count'] + count
+    delta = mean - sketch['mean']
+    sketch['mean'] += delta * count / total
+    sketch['m2'] += m2 + delta * delta * sketch['count'] * count / total
+    sketch['count'] = total
+    sketch['min'] = np.fmin(sketch['min'], low)
+    sketch['max'] = np.fmax(sketch['max'], high)
+
+def compact_quantile_sketch(sketch):
+    """Halve every level that holds more than size values, promoting every other value to the level above"""
+    levels = sketch['levels']
+    level = 0
+    while level < len(levels):
+        values = levels[level]
+        if len(values) > sketch['size']:
+            values = np.sort(values)
+            # An odd value out stays on this level
+            keep = values[len(values) - len(values) % 2:]
+            # A random offset keeps the rank error unbiased; seeded so a run is reproducible
+            offset = np.random.default_rng(sketch['seed']).integers(2)
+            sketch['seed'] += 1
+            promoted = values[offset:len(values) - len(keep):2]
+            # Each compaction moves a rank by at most the weight of this level, either way
+            sketch['variance'] += float(4 ** level)
+            levels[level] = keep
+            if level + 1 == len(levels):
+                levels.append(promoted)
+            else:
+                levels[level + 1] = np.concatenate([levels[level + 1], promoted])
+        level += 1
+    return sketch
+
+def add_to_quantile_sketch(sketch, values):
+    """Add non-null numeric values to a quantile sketch (in place)"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return sketch
+    mean = values.mean()
+    merge_moments(sketch, len(values), mean, ((values - mean) ** 2).sum(), values.min(), values.max())
+    if sketch['levels']:
+        sketch['levels'][0] = np.concatenate([sketch['levels'][0], values])
+    else:
+        sketch['levels'].append(values)
+    return compact_quantile_sketch(sketch)
+
+def merge_quantile_sketches(sketch, other):
+    """Merge another quantile sketch into sketch (in place)"""
+    merge_moments(sketch, other['count'], other['mean'], other['m2'], other['min'], other['max'])
+    for level, values in enumerate(other['levels']):
+        if level < len(sketch['levels']):
+            sketch['levels'][level] = np.concatenate([sketch['levels'][level], values])
+        else:
+            sketch['levels'].append(values)
+    sketch['variance'] += other['variance']
+    return compact_quantile_sketch(sketch)
+
+def sketch_quantile(sketch, q):
+    """Approximate q-quantile of the values added (NaN for an empty sketch)"""
+    if sketch['count'] == 0:
+        return np.nan
+    q = min(max(q, 0.0), 1.0)
+    values = np.concatenate(sketch['levels'])
+    # Nothing compacted yet: the sketch still holds every value, so the quantile is exact (interpolated like describe())
+    if sketch['variance'] == 0:
+        return float(np.quantile(values, q))
+    weights = np.concatenate([np.full(len(v), 2.0 ** level) for level, v in enumerate(sketch['levels'])])
+    order = np.argsort(values, kind='stable')
+    ranks = np.cumsum(weights[order])
+    position = min(np.searchsorted(ranks, q * ranks[-1], side='left'), len(values) - 1)
+    return float(np.clip(values[order][position], sketch['min'], sketch['max']))
+
+def quantile_rank_error(sketch):
+    """Rank error of the sketch's quantiles as a fraction of the count (two standard deviations)"""
+    if sketch['count'] == 0:
+        return 0.0
+    return 2 * np.sqrt(sketch['variance']) / sketch['count']
+
+def sketch_describe(sketch):
+    """describe()-like statistics from a quantile sketch (quartiles approximate, the rest exact)"""
+    count = sketch['count']
+    return pd.Series({
+        'count': float(count),
+        'mean': sketch['mean'] if count else np.nan,
+        'std': np.sqrt(sketch['m2'] / (count - 1)) if count > 1 else np.nan,
+        'min': sketch['min'],
+        '25%': sketch_quantile(sketch, 0.25),
+        '50%': sketch_quantile(sketch, 0.5),
+        '75%': sketch_quantile(sketch, 0.75),
+        'max': sketch['max'],
+    })
+
+def sketch_stats_differ(sketch1, sketch2, quantiles=(0.25, 0.5, 0.75)):
+    """
+    Whether two quantile sketches describe different values: the exact statistics differ, or a quartile of one file
+    falls outside the range the other file's sketch allows for it within both rank errors
+    """
+    stats1 = sketch_describe(sketch1)
+    stats2 = sketch_describe(sketch2)
+    exact = ['count', 'mean', 'std', 'min', 'max']
+    if not np.allclose(stats1[exact], stats2[exact], rtol=1e-05, equal_nan=True):
+        return True
+    error = quantile_rank_error(sketch1) + quantile_rank_error(sketch2)
+    for q in quantiles:
+        low = sketch_quantile(sketch1, q - error)
+        high = sketch_quantile(sketch1, q + error)
+        if not low <= sketch_quantile(sketch2, q) <= high:
+            return True
+    return False
+
+def is_stats_column(dtype):
+    """Columns that get the statistical comparison (numeric, but not boolean)"""
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+def profile_column(values):
+    """Compute every per-column metric of one column in a single pass (distinct counts and statistics sketched in sketch mode)"""
+    metrics = {
+        'nulls': values.isna().sum(),
+        'empties': 0,
+    }
+    if SKETCH_MODE:
+        distinct = add_to_distinct_sketch(new_distinct_sketch(), pd.util.hash_pandas_object(values.dropna(), index=False))
+        metrics['unique'] = distinct_estimate(distinct)
+        metrics['unique_error'] = distinct_error(distinct)
+    else:
+        metrics['unique'] = values.nunique()
+    if values.dtype == 'object':
+        metrics['empties'] = (values == '').sum()
+        text = values.astype(str)
+        metrics['spaces'] = (text.str.len() != text.str.strip().str.len()).sum()
+    if is_stats_column(values.dtype):
+        if SKETCH_MODE:
+            metrics['quantile_sketches'] = add_to_quantile_sketch(new_quantile_sketch(), values.dropna().to_numpy(dtype='float64'))
+            metrics['stats'] = sketch_describe(metrics['quantile_sketches'])
+        else:
+            metrics['stats'] = values.describe()
+    return metrics
+
+def profile_column_task(frames, col):
+    """Profile one column of the shared frame (errors are reported and the column is skipped)"""
+    try:
+        return profile_column(frames['df'][col])
+    except Exception as e:
+        print(f"Error profiling column {col}: {str(e)}")
+        return None
+
+@instrumented
+def profile_columns(df, workers=None):
+    """
+    Profile every column of a file in one pass (nulls, empty strings, whitespace, distinct values and statistics);
+    the report sections read from this profile.
+    In sketch mode 'unique_error' and 'quantile_sketches' hold the error bounds of the approximate metrics
+    """
+    profile = {
+        'rows': len(df),
+        'dtypes': df.dtypes.to_dict(),
+        'nulls': {},
+        'empties': {},
+        'spaces': {},
+        'unique': {},
+        'unique_error': {},
+        'stats': {},
+        'quantile_sketches': {},
+    }
+    columns = list(df.columns)
+    for col, metrics in zip(columns, run_column_tasks(profile_column_task, {'df': df}, columns, workers)):
+        if metrics is None:
+            continue
+        for name, value in metrics.items():
+            profile[name][col] = value
+    return profile
+
+def text_columns(common_cols, profile1, profile2):
+    """Common columns that are text in both files (the ones that get the format consistency checks)"""
+    return [col for col in common_cols if profile1['dtypes'][col] == 'object' and profile2['dtypes'][col] == 'object']
+
+def case_difference_task(frames, col):
+    """Number of rows (by position) whose lowercased values differ in one column of the shared frames"""
+    lower1 = frames['df1'][col].astype(str).str.lower().to_numpy()
+    lower2 = frames['df2'][col].astype(str).str.lower().to_numpy()
+    return (lower1 != lower2).sum()
+
+@instrumented
+def case_differences(df1, df2, common_cols, profile1, profile2, workers=None):
+    """Count the rows (by position) whose values differ between the files when lowercased, per common text column"""
+    columns = text_columns(common_cols, profile1, profile2)
+    # Files of different length can't be compared by position
+    if len(df1) != len(df2):
+        return {col: 0 for col in columns}
+    return dict(zip(columns, run_column_tasks(case_difference_task, {'df1': df1, 'df2': df2}, columns, workers)))
+
+def record_count_section(profile1, profile2):
+    """BASIC RECORD COUNT section lines"""
+    results = ["=== BASIC RECORD COUNT ==="]
+    records_match = profile1['rows'] == profile2['rows']
+    results.append(f"Record Count Check: {'PASS' if records_match else 'FAIL'}")
+    results.append(f"File 1 records: {profile1['rows']}")
+    results.append(f"File 2 records: {profile2['rows']}")
+    return results
+
+def column_analysis_section(df1, df2):
+    """COLUMN ANALYSIS section lines (only the columns of df1 and df2 are used)"""
+    results = ["\n=== COLUMN ANALYSIS ==="]
     cols1 = set(df1.columns)
     cols2 = set(df2.columns)
-    common_cols = list(cols1.intersection(cols2))
     
     # Find missing or extra columns
     missing_cols = cols1 - cols2
@@ -332,137 +1453,1234 @@ def enhanced_csv_comparison(file1_path, file2_path):
         results.append("\nColumn Order Differences:")
         for diff in order_differences:
             results.append(f"  {diff}")
-    
-    # Data Type Consistency Check
-    results.append("\n=== DATA TYPE CONSISTENCY ===")
+    return results
+
+def data_type_section(common_cols, profile1, profile2):
+    """DATA TYPE CONSISTENCY section lines"""
+    results = ["\n=== DATA TYPE CONSISTENCY ==="]
     for col in common_cols:
-        dtype1 = df1[col].dtype
-        dtype2 = df2[col].dtype
+        dtype1 = profile1['dtypes'][col]
+        dtype2 = profile2['dtypes'][col]
         if dtype1 != dtype2:
             results.append(f"Data type mismatch in column '{col}': File1={dtype1}, File2={dtype2}")
-    
-    # Null Value Analysis
-    results.append("\n=== NULL VALUE ANALYSIS ===")
+    return results
+
+def null_value_section(common_cols, profile1, profile2):
+    """NULL VALUE ANALYSIS section lines"""
+    results = ["\n=== NULL VALUE ANALYSIS ==="]
     for col in common_cols:
-        nulls1 = df1[col].isna().sum()
-        nulls2 = df2[col].isna().sum()
-        empty1 = (df1[col] == '').sum() if df1[col].dtype == 'object' else 0
-        empty2 = (df2[col] == '').sum() if df2[col].dtype == 'object' else 0
+        nulls1 = profile1['nulls'].get(col, 0)
+        nulls2 = profile2['nulls'].get(col, 0)
+        empty1 = profile1['empties'].get(col, 0)
+        empty2 = profile2['empties'].get(col, 0)
         
         if nulls1 != nulls2 or empty1 != empty2:
             results.append(f"Null/Empty value mismatch in '{col}':")
             results.append(f"  File1: {nulls1} nulls, {empty1} empty strings")
             results.append(f"  File2: {nulls2} nulls, {empty2} empty strings")
-    
-    # Format Consistency Check
-    results.append("\n=== FORMAT CONSISTENCY ===")
+    return results
+
+def format_consistency_section(common_cols, profile1, profile2, case_diffs):
+    """FORMAT CONSISTENCY section lines (leading/trailing spaces and case differences in text columns)"""
+    results = ["\n=== FORMAT CONSISTENCY ==="]
+    for col in text_columns(common_cols, profile1, profile2):
+        # Check for leading/trailing spaces
+        spaces1 = profile1['spaces'].get(col, 0)
+        spaces2 = profile2['spaces'].get(col, 0)
+        if spaces1 != spaces2:
+            results.append(f"Leading/trailing space differences in '{col}':")
+            results.append(f"  File1: {spaces1} values with extra spaces")
+            results.append(f"  File2: {spaces2} values with extra spaces")
+        
+        # Case sensitivity check
+        case_diff = case_diffs.get(col, 0)
+        if case_diff > 0:
+            results.append(f"Case sensitivity differences in '{col}': {case_diff} mismatches")
+    return results
+
+def statistical_section(common_cols, profile1, profile2):
+    """STATISTICAL COMPARISON section lines for the numeric columns"""
+    results = ["\n=== STATISTICAL COMPARISON ==="]
     for col in common_cols:
         try:
-            if df1[col].dtype == 'object' and df2[col].dtype == 'object':
-                # Convert to string and strip for comparison
-                s1 = df1[col].astype(str).reset_index(drop=True)
-                s2 = df2[col].astype(str).reset_index(drop=True)
+            if col in profile1['stats'] and col in profile2['stats']:
+                stats1 = profile1['stats'][col]
+                stats2 = profile2['stats'][col]
                 
-                # Check for leading/trailing spaces
-                spaces1 = (s1.str.len() != s1.str.strip().str.len()).sum()
-                spaces2 = (s2.str.len() != s2.str.strip().str.len()).sum()
-                if spaces1 != spaces2:
-                    results.append(f"Leading/trailing space differences in '{col}':")
-                    results.append(f"  File1: {spaces1} values with extra spaces")
-                    results.append(f"  File2: {spaces2} values with extra spaces")
+                # Sketched quartiles only differ when they are further apart than the sketches' rank errors
+                sketch1 = profile1.get('quantile_sketches', {}).get(col)
+                sketch2 = profile2.get('quantile_sketches', {}).get(col)
+                if sketch1 is not None and sketch2 is not None:
+                    differs = sketch_stats_differ(sketch1, sketch2)
+                    rank_error = max(quantile_rank_error(sketch1), quantile_rank_error(sketch2))
+                    error = f" (approximate median, ±{100 * rank_error:.2f}% rank)" if rank_error else ""
+                else:
+                    differs = not np.allclose(stats1, stats2, rtol=1e-05, equal_nan=True)
+                    error = ""
                 
-                # Case sensitivity check - compare values directly
-                case_diff = string_compare(s1.str.lower(), s2.str.lower())
-                if case_diff > 0:
-                    results.append(f"Case sensitivity differences in '{col}': {case_diff} mismatches")
+                if differs:
+                    results.append(f"\nStatistical differences in column '{col}'{error}:")
+                    results.append(f"  File1: mean={stats1['mean']:.2f}, median={stats1['50%']:.2f}")
+                    results.append(f"  File 2: mean={stats2['mean']:.2f}, median={stats2['50%']:.2f}")
         except Exception as e:
-            print(f"Error in format consistency check for column {col}: {str(e)}")
+            print(f"Error in statistical comparison for column {col}: {str(e)}")
             continue
-    
-    # Value Comparison with Record Identification
-    results.append("\n=== VALUE COMPARISON ===")
+    return results
+
+def value_distribution_section(common_cols, profile1, profile2):
+    """VALUE DISTRIBUTION section lines (number of distinct values per column; estimates are shown with their error)"""
+    results = ["\n=== VALUE DISTRIBUTION ==="]
+    for col in common_cols:
+        unique1 = profile1['unique'].get(col)
+        unique2 = profile2['unique'].get(col)
+        if unique1 != unique2:
+            error1 = profile1.get('unique_error', {}).get(col)
+            error2 = profile2.get('unique_error', {}).get(col)
+            results.append(f"Different number of unique values in '{col}':")
+            results.append(f"  File1: {'' if error1 is None else '~'}{unique1} unique values"
+                           + ("" if error1 is None else f" (±{100 * error1:.1f}%)"))
+            results.append(f"  File2: {'' if error2 is None else '~'}{unique2} unique values"
+                           + ("" if error2 is None else f" (±{100 * error2:.1f}%)"))
+    return results
+
+def enhanced_csv_comparison(file1_path, file2_path, workers=None, state_file=None, report=None, mismatch_file=None):
+    """
+    Enhanced comparison of two CSV files with data quality checks;
+    workers > 1 spreads the per-column checks over a process pool (same report as the serial run);
+    with a state_file the value comparison only reports what changed since the run that saved it;
+    with a report sink (see open_report) the report is written to it as it is produced and None is returned in its place
+    (files that can't be read then raise instead of being reported);
+    with a mismatch_file the value mismatches are also saved as a Parquet/Arrow table.
+    Each step is measured as a phase (see measure_phase)
+    """
     try:
-        value_differences = compare_values_with_identification(df1, df2, common_cols, key_columns=KEY_COLUMNS)
-        results.extend(value_differences)
+        with measure_phase("read_files") as phase:
+            # Read CSVs without assuming column order (unchanged files come from the parsed-input cache, if set)
+            df1 = read_csv_cached(file1_path, **csv_read_options(file1_path))
+            df2 = read_csv_cached(file2_path, **csv_read_options(file2_path))
+            # The column analysis covers every column in the files, also those that are not read
+            header1 = pd.read_csv(file1_path, nrows=0)
+            header2 = pd.read_csv(file2_path, nrows=0)
+            phase['rows'] = len(df1) + len(df2)
     except Exception as e:
-        results.append(f"Error comparing values: {str(e)}")
+        # With a report sink the error goes to the caller, so a failed run does not leave a report that looks complete
+        if report is not None:
+            raise
+        return f"Error reading files: {str(e)}", None
+    rows = len(df1) + len(df2)
+    
+    # Profile each file once; the column checks below all read from these profiles
+    with measure_phase("column_profiles", rows=rows):
+        profile1 = profile_columns(df1, workers=workers)
+        profile2 = profile_columns(df2, workers=workers)
+    common_cols = list(set(df1.columns).intersection(set(df2.columns)))
+    
+    # Without a report sink the report is built in memory and returned as text
+    text_report = report is None
+    if text_report:
+        report = open_report()
+    
+    # Add timestamp and file information header
+    write_report(report, [get_timestamp_header(file1_path, file2_path)])
+    
+    # Basic checks and column checks
+    with measure_phase("record_count_section", rows=rows):
+        write_report(report, record_count_section(profile1, profile2))
+    with measure_phase("column_analysis_section"):
+        write_report(report, column_analysis_section(header1, header2))
+    with measure_phase("data_type_section"):
+        write_report(report, data_type_section(common_cols, profile1, profile2))
+    with measure_phase("null_value_section"):
+        write_report(report, null_value_section(common_cols, profile1, profile2))
+    with measure_phase("format_consistency_section", rows=rows):
+        write_report(report, format_consistency_section(common_cols, profile1, profile2,
+                                                              case_differences(df1, df2, common_cols, profile1, profile2, workers=workers)))
+    
+    # Value Comparison with Record Identification
+    write_report(report, ["\n=== VALUE COMPARISON ==="])
+    with measure_phase("value_comparison", rows=rows):
+        try:
+            value_differences = None
+            if state_file is not None:
+                try:
+                    value_differences = incremental_value_comparison(df1, df2, common_cols, KEY_COLUMNS, state_file,
+                                                                     workers=workers, mismatch_file=mismatch_file)
+                except Exception as e:
+                    print(f"Error in incremental comparison, running a full comparison: {str(e)}")
+            if value_differences is None:
+                value_differences = compare_values_with_identification(df1, df2, common_cols, key_columns=KEY_COLUMNS,
+                                                                       workers=workers, mismatch_file=mismatch_file)
+            # The mismatch lines are formatted while they are written
+            with measure_phase("write_value_mismatches"):
+                write_report(report, value_differences)
+        except Exception as e:
+            write_report(report, [f"Error comparing values: {str(e)}"])
     
     # Statistical Comparison for Numeric Columns
-    results.append("\n=== STATISTICAL COMPARISON ===")
-    for col in common_cols:
+    with measure_phase("statistical_section"):
+        write_report(report, statistical_section(common_cols, profile1, profile2))
+    
+    with measure_phase("duplicates_and_missing", rows=rows):
         try:
-            if pd.api.types.is_numeric_dtype(df1[col]) and pd.api.types.is_numeric_dtype(df2[col]):
-                stats1 = df1[col].describe()
-                stats2 = df2[col].describe()
-                
-                if not np.allclose(stats1, stats2, rtol=1e-05, equal_nan=True):
-                    results.append(f"\nStatistical differences in column '{col}':")
-                    results.append(f"  File1: mean={stats1['mean']:.2f}, median={stats1['50%']:.2f}")
-                    results.append(f"  File 2: mean={stats2['mean']:.2f}, median={stats2['50%']:.2f}")
+            # Find duplicates and missing records
+            error_records = find_duplicates_and_missing(df1, df2, key_columns=KEY_COLUMNS)
+            
+            # Add error records summary to the report
+            write_report(report, error_records_summary(error_records))
+        
         except Exception as e:
-            print(f"Error in statistical comparison for column {col}: {str(e)}")
+            print(f"Detailed error in duplicate/missing record detection: {str(e)}")
+            write_report(report, ["\n=== ERROR FINDING DUPLICATES/MISSING RECORDS ==="])
+            write_report(report, [f"Error: {str(e)}"])
+            error_records = None
+    
+    # Value Distribution Analysis (moved to end)
+    with measure_phase("value_distribution_section"):
+        write_report(report, value_distribution_section(common_cols, profile1, profile2))
+    
+    return (close_report(report) if text_report else None), error_records
+
+# ================================================================
+# QUICK CHECK - estimate mismatch rates from a sample of the keys
+# ================================================================
+# Files up to QUICK_CHECK_MB are read whole; larger files are read in QUICK_CHECK_BLOCKS evenly spaced byte ranges
+# of QUICK_BLOCK_MB in all (seeking to each one and starting at the next full line), so the check reads a bounded part
+# of the file. Only the key columns are parsed first; the full records are then parsed for the keys in the sample,
+# which is picked by key hash so both files sample the same keys (always with the C parser, which can skip rows).
+# Missing/extra/value mismatch rates are estimated on that sample with Wilson score intervals. A file read in blocks
+# holds only part of its keys, so the keys of the other file that are missing from it can't be estimated: missing
+# records need the target read whole, extra records the source. The record count of a file read in blocks is
+# estimated from the records per byte of its blocks; counts whose intervals don't overlap are a difference too.
+# Records with quoted line breaks can break a block.
+
+def read_file_keys(file_path, key_columns, max_bytes=None, block_bytes=None, blocks=None, **read_options):
+    """
+    Read a file, or evenly spaced byte ranges of it (block_bytes in all) when it is larger than max_bytes, and parse
+    its key columns. Returns the bytes read (with the header), the keys, the share of the file's bytes they came from
+    and the (low, high) number of records in the file (an interval estimate for block samples)
+    """
+    if max_bytes is None:
+        max_bytes = QUICK_CHECK_MB * 1024 * 1024
+    if block_bytes is None:
+        block_bytes = QUICK_BLOCK_MB * 1024 * 1024
+    if blocks is None:
+        blocks = QUICK_CHECK_BLOCKS
+    options = {name: value for name, value in read_options.items() if name != 'engine'}
+    size = os.path.getsize(file_path)
+    if size <= max_bytes:
+        with open(file_path, "rb") as f:
+            data = f.read()
+        keys = pd.read_csv(io.BytesIO(data), **dict(options, usecols=key_columns))
+        return data, keys, 1.0, (len(keys), len(keys))
+    
+    block_size = max(min(block_bytes, max_bytes) // blocks, 1)
+    pieces = []
+    with open(file_path, "rb") as f:
+        header = f.readline()
+        data_start = f.tell()
+        for block in range(blocks):
+            offset = data_start + (size - data_start - block_size) * block // max(blocks - 1, 1)
+            f.seek(offset)
+            # Skip the partly read line, and leave out the line the block ends in
+            if offset > data_start:
+                f.readline()
+            data = f.read(block_size)
+            end = data.rfind(b"\n") + 1 if f.tell() < size else len(data)
+            if end:
+                pieces.append(data[:end] if data[:end].endswith(b"\n") else data[:end] + b"\n")
+    data = header + b"".join(pieces)
+    keys = pd.read_csv(io.BytesIO(data), **dict(options, usecols=key_columns))
+    
+    # Records per byte of each block (a block ends in a full line), scaled to the whole file
+    data_bytes = max(size - data_start, 1)
+    share = sum(len(piece) for piece in pieces) / data_bytes
+    densities = np.array([piece.count(b"\n") / len(piece) for piece in pieces]) if pieces else np.zeros(1)
+    estimate = densities.mean() * data_bytes
+    spread = densities.std(ddof=1) / np.sqrt(len(densities)) if len(densities) > 1 else densities.mean()
+    z = NormalDist().inv_cdf(0.5 + QUICK_CONFIDENCE / 2)
+    margin = z * spread * np.sqrt(max(1 - share, 0)) * data_bytes
+    return data, keys, share, (max(len(keys), int(estimate - margin)), int(np.ceil(estimate + margin)))
+
+def read_sampled_records(data, sampled, **read_options):
+    """Parse only the records of CSV bytes that are marked in sampled (one flag per record)"""
+    options = {name: value for name, value in read_options.items() if name != 'engine'}
+    # Without quotes (and blank lines) every line after the header is one record: cut the sampled lines out directly
+    if data.find(b'"') == -1:
+        lines = data.split(b"\n")
+        if not lines[-1]:
+            lines.pop()
+        if len(lines) == len(sampled) + 1:
+            selected = [lines[0]] + [lines[row + 1] for row in np.flatnonzero(sampled)]
+            return pd.read_csv(io.BytesIO(b"\n".join(selected) + b"\n"), **options)
+    # Row numbers count records after the header line
+    skipped = set((np.flatnonzero(~sampled) + 1).tolist())
+    return pd.read_csv(io.BytesIO(data), skiprows=skipped, **options)
+
+def sample_by_key(keys, key_columns, sample_rate, text=True):
+    """
+    Mask of the rows whose key hash falls in the lowest sample_rate share of the hash range (the same keys in every
+    file); keys are hashed in their string form, or in their own dtype without text (when it is the same in every file)
+    """
+    hashes = hash_row_strings(keys, key_columns) if text else pd.util.hash_pandas_object(keys[key_columns], index=False).to_numpy()
+    # The top 53 bits of the hash as a fraction in [0, 1)
+    return (hashes >> np.uint64(11)).astype(np.float64) / 2.0 ** 53 < sample_rate
+
+def wilson_interval(count, total, confidence=None):
+    """Wilson score interval for a proportion count / total (NaN bounds without observations)"""
+    if confidence is None:
+        confidence = QUICK_CONFIDENCE
+    if total == 0:
+        return np.nan, np.nan
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    rate = count / total
+    center = (rate + z * z / (2 * total)) / (1 + z * z / total)
+    spread = z * np.sqrt(rate * (1 - rate) / total + z * z / (4 * total * total)) / (1 + z * z / total)
+    # The bounds are exactly 0 without any hits and 1 when all are hits (rounding would leave them just off)
+    low = 0.0 if count == 0 else max(0.0, float(center - spread))
+    high = 1.0 if count == total else min(1.0, float(center + spread))
+    return low, high
+
+def rate_line(label, count, total, confidence=None):
+    """One quick-check report line: count out of total, the rate and its confidence interval"""
+    if confidence is None:
+        confidence = QUICK_CONFIDENCE
+    if total == 0:
+        return f"{label}: no sampled records to estimate from"
+    low, high = wilson_interval(count, total, confidence)
+    return (f"{label}: {count} of {total} sampled = {count / total:.2%} "
+            f"({confidence:.0%} CI {low:.2%} - {high:.2%})")
+
+def count_text(counts, confidence=None):
+    """A record count for the quick-check report: exact, or an estimate with its confidence interval"""
+    if confidence is None:
+        confidence = QUICK_CONFIDENCE
+    low, high = counts
+    if low == high:
+        return str(low)
+    return f"~{(low + high) // 2} ({confidence:.0%} CI {low} - {high})"
+
+def quick_csv_comparison(file1_path, file2_path, key_columns=None, sample_rate=None, max_mb=None, block_mb=None, report=None):
+    """
+    Quick go/no-go check before a full comparison: missing, extra and value mismatch rates on a key-hash sample
+    of both files, with confidence intervals, and the record counts. Returns the report text (None with a report
+    sink) and the estimates; estimates['different'] is True as soon as the sample shows any difference,
+    estimates['unknown'] when it shows none but nothing was sampled or missing/extra records could not be estimated
+    """
+    if key_columns is None:
+        key_columns = KEY_COLUMNS
+    if isinstance(key_columns, str):
+        key_columns = [key_columns]
+    if sample_rate is None:
+        sample_rate = QUICK_SAMPLE_RATE
+    if max_mb is None:
+        max_mb = QUICK_CHECK_MB
+    if block_mb is None:
+        block_mb = QUICK_BLOCK_MB
+    
+    try:
+        header1 = pd.read_csv(file1_path, nrows=0)
+        header2 = pd.read_csv(file2_path, nrows=0)
+    except Exception as e:
+        if report is not None:
+            write_report(report, [f"Error reading files: {str(e)}"])
+            return None, None
+        return f"Error reading files: {str(e)}", None
+    for col in key_columns:
+        if col not in header1.columns or col not in header2.columns:
+            raise ValueError(f"Key column '{col}' not found in both files")
+    
+    try:
+        options1 = csv_read_options(file1_path)
+        options2 = csv_read_options(file2_path)
+        data1, keys1, share1, counts1 = read_file_keys(file1_path, key_columns, int(max_mb * 1024 * 1024),
+                                                       int(block_mb * 1024 * 1024), **options1)
+        data2, keys2, share2, counts2 = read_file_keys(file2_path, key_columns, int(max_mb * 1024 * 1024),
+                                                       int(block_mb * 1024 * 1024), **options2)
+        # Keys of the same dtype in both files are hashed natively, the others by their string form
+        text = any(keys1[col].dtype != keys2[col].dtype for col in key_columns)
+        sample1 = read_sampled_records(data1, sample_by_key(keys1, key_columns, sample_rate, text), **options1)
+        sample2 = read_sampled_records(data2, sample_by_key(keys2, key_columns, sample_rate, text), **options2)
+        records1, records2 = len(keys1), len(keys2)
+        del data1, data2, keys1, keys2
+    except Exception as e:
+        if report is not None:
+            write_report(report, [f"Error reading files: {str(e)}"])
+            return None, None
+        return f"Error reading files: {str(e)}", None
+    common_cols = list(set(sample1.columns).intersection(set(sample2.columns)))
+    # A sample without its file's nulls parses an integer column as int64 where the whole file gives float64
+    for col in common_cols:
+        if {sample1[col].dtype.kind, sample2[col].dtype.kind} == {'i', 'f'}:
+            sample1[col] = sample1[col].astype('float64')
+            sample2[col] = sample2[col].astype('float64')
+    
+    # Rates are per distinct key: missing keys out of file1's, extra keys out of file2's, mismatches out of the shared ones
+    keys1 = build_merge_key(sample1, key_columns).drop_duplicates()
+    keys2 = build_merge_key(sample2, key_columns).drop_duplicates()
+    shared = int(keys1.isin(keys2).sum())
+    # A key can only be told missing from (or extra in) a file that was read whole
+    whole1 = share1 == 1
+    whole2 = share2 == 1
+    missing = int((~keys1.isin(keys2)).sum()) if whole2 else None
+    extra = int((~keys2.isin(keys1)).sum()) if whole1 else None
+    mismatches = find_value_mismatches(sample1, sample2, common_cols, key_columns)
+    mismatching_rows = [m['_file1_row'].to_numpy() for m in mismatches.values()]
+    mismatching = len(np.unique(np.concatenate(mismatching_rows))) if mismatching_rows else 0
+    # Record counts differ when their (exact or estimated) ranges don't overlap
+    count_gap = counts1[1] < counts2[0] or counts2[1] < counts1[0]
+    
+    different = bool(missing or extra or mismatching or count_gap)
+    nothing_sampled = not len(keys1) and not len(keys2)
+    estimates = {
+        'sampled_keys1': len(keys1),
+        'sampled_keys2': len(keys2),
+        'records1': counts1,
+        'records2': counts2,
+        'missing_rate': wilson_interval(missing, len(keys1)) if whole2 else None,
+        'extra_rate': wilson_interval(extra, len(keys2)) if whole1 else None,
+        'mismatch_rate': wilson_interval(mismatching, shared),
+        'count_gap': count_gap,
+        'different': different,
+        'unknown': not different and (nothing_sampled or not (whole1 and whole2)),
+    }
+    
+    # Without a report sink the report is built in memory and returned as text
+    text_report = report is None
+    if text_report:
+        report = open_report()
+    
+    write_report(report, [get_timestamp_header(file1_path, file2_path)])
+    results = ["=== QUICK CHECK (SAMPLE) ==="]
+    for name, sample, records, share, counts in [("File 1", sample1, records1, share1, counts1),
+                                                 ("File 2", sample2, records2, share2, counts2)]:
+        source = "whole file" if share == 1 else f"{share:.1%} of the file in {QUICK_CHECK_BLOCKS} blocks, {count_text(counts)} records in total"
+        results.append(f"{name}: {len(sample)} sampled of {records} records read ({source})")
+    results.append(f"Key sample rate: {sample_rate:.1%}")
+    results.append(f"Record counts: {'DIFFERENT' if count_gap else 'consistent'} "
+                   f"(File 1: {count_text(counts1)}, File 2: {count_text(counts2)})")
+    if whole2:
+        results.append(rate_line("Missing records in target", missing, len(keys1)))
+    else:
+        results.append("Missing records in target: not estimated (file 2 was read in blocks; raise QUICK_CHECK_MB to read it whole)")
+    if whole1:
+        results.append(rate_line("Extra records in target", extra, len(keys2)))
+    else:
+        results.append("Extra records in target: not estimated (file 1 was read in blocks; raise QUICK_CHECK_MB to read it whole)")
+    results.append(rate_line("Records with value mismatches", mismatching, shared))
+    for col, mismatch_records in mismatches.items():
+        results.append("  - " + rate_line(f"column '{col}'", len(mismatch_records), shared))
+    if different:
+        results.append("\nVerdict: DIFFERENT (the sample already shows differences)")
+    elif nothing_sampled:
+        results.append("\nVerdict: UNKNOWN (no records sampled; raise the sample rate)")
+    elif not (whole1 and whole2):
+        results.append("\nVerdict: INCONCLUSIVE (no differences in the sample, but missing/extra records could not be "
+                       "estimated for a file read in blocks; raise QUICK_CHECK_MB or run the full comparison)")
+    else:
+        high = max(estimates[name][1] for name in ['missing_rate', 'extra_rate', 'mismatch_rate'] if not np.isnan(estimates[name][1]))
+        results.append(f"\nVerdict: NO DIFFERENCES FOUND in the sample (each rate below {high:.2%} "
+                       f"at {QUICK_CONFIDENCE:.0%} confidence)")
+    write_report(report, results)
+    
+    return (close_report(report) if text_report else None), estimates
+
+# ================================================================
+# STREAMING MODE - compare files that do not fit in memory
+# ================================================================
+# The files are read three times in chunks:
+#   1. resolve one dtype per column (so every chunk is parsed the same way a whole-file read would be)
+#   2. accumulate the per-column checks and one hash per row for the key/duplicate/value analysis
+#   3. pull back only the rows that end up in the report (duplicates, missing/extra, mismatching records)
+# Memory use is bounded by MEMORY_BUDGET_MB for the chunks and the per-column checks: each column keeps its exact
+# distinct value hashes and numeric values only while they fit in its part of STREAM_COLUMN_STATE_SHARE, and then
+# switches to a fixed-size HyperLogLog and quantile sketch (as in sketch mode). The keyed analysis adds four 64-bit
+# hashes per row of each file on top of that (none with SPILL_BUCKETS, where they are computed bucket by bucket).
+
+STREAMING_OVERHEAD_FACTOR = 4 # Each chunk is copied a few times while hashing/stringifying; keep headroom for it
+
+def chunk_rows_for_budget(file_paths, memory_budget_mb=None, sample_rows=1000):
+    """Estimate how many rows per chunk fit in the chunks' part of the memory budget (all files are read side by side)"""
+    if memory_budget_mb is None:
+        memory_budget_mb = MEMORY_BUDGET_MB
+    memory_budget_mb *= 1 - STREAM_COLUMN_STATE_SHARE
+    
+    # Measure the in-memory size of a row from a small sample of each file
+    bytes_per_row = 0
+    for file_path in file_paths:
+        sample = pd.read_csv(file_path, nrows=sample_rows)
+        if len(sample):
+            bytes_per_row += sample.memory_usage(deep=True, index=False).sum() / len(sample)
+    bytes_per_row = max(bytes_per_row, 1) * STREAMING_OVERHEAD_FACTOR
+    
+    return max(1000, int(memory_budget_mb * 1024 * 1024 / bytes_per_row))
+
+def column_state_limit(num_columns, memory_budget_mb=None):
+    """Bytes of exact per-column state (distinct hashes and numeric values) each column may keep before it is sketched"""
+    if memory_budget_mb is None:
+        memory_budget_mb = MEMORY_BUDGET_MB
+    return int(memory_budget_mb * STREAM_COLUMN_STATE_SHARE * 1024 * 1024 / max(num_columns, 1))
+
+def unify_chunk_dtypes(dtypes):
+    """Resolve the dtype a whole-file read would give a column from the dtypes of its chunks"""
+    unique_dtypes = list(dict.fromkeys(dtypes))
+    if len(unique_dtypes) == 1:
+        return unique_dtypes[0]
+    # Integer chunks mixed with float chunks (nulls) become float, anything else becomes text
+    if all(pd.api.types.is_integer_dtype(d) or pd.api.types.is_float_dtype(d) for d in unique_dtypes):
+        return np.dtype('float64')
+    return np.dtype('object')
+
+def resolve_csv_dtypes(file_path, chunk_rows, usecols=None, dtype=None):
+    """
+    First streaming pass: find the dtype of every column across all chunks of the file;
+    columns with a declared dtype keep it, and the pass is skipped when every column is declared
+    """
+    declared = {col: pd.api.types.pandas_dtype(value) for col, value in (dtype or {}).items()}
+    columns = pd.read_csv(file_path, nrows=0, usecols=usecols).columns
+    if all(col in declared for col in columns):
+        return {col: declared[col] for col in columns}
+    
+    seen = {col: [] for col in columns}
+    for chunk in pd.read_csv(file_path, chunksize=chunk_rows, usecols=usecols, dtype=declared or None):
+        for col, chunk_dtype in chunk.dtypes.items():
+            seen[col].append(chunk_dtype)
+    # A header-only file reads as text columns
+    return {col: declared.get(col) or (unify_chunk_dtypes(dtypes) if dtypes else np.dtype('object'))
+            for col, dtypes in seen.items()}
+
+def iter_csv_chunks(file_path, chunk_rows, dtypes):
+    """Read the resolved columns of a CSV file in chunks with pinned dtypes (the index keeps counting rows across chunks)"""
+    return pd.read_csv(file_path, chunksize=chunk_rows, usecols=list(dtypes), dtype=dtypes)
+
+def hash_rows(df, columns):
+    """64-bit hash per row over the given columns; equal values give equal hashes"""
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+def hash_row_strings(df, columns):
+    """64-bit hash per row over the string form of the given columns (how keys and values are compared)"""
+    if not columns:
+        return np.zeros(len(df), dtype=np.uint64)
+    return pd.util.hash_pandas_object(df[columns].astype(str), index=False).to_numpy()
+
+def hash_keyed_rows(df, key_columns, compare_cols):
+    """Per-row hashes used by the keyed analysis: key values, merge key, the full row and the compared values"""
+    hashes = {
+        'key_hashes': hash_row_strings(df, key_columns),
+        'row_hashes': hash_rows(df, list(df.columns)),
+        'digests': hash_row_strings(df, compare_cols),
+    }
+    # With a single key column the merge key is the key itself
+    if len(key_columns) > 1:
+        merge_keys = build_merge_key(df, key_columns)
+        hashes['merge_key_hashes'] = pd.util.hash_pandas_object(merge_keys, index=False).to_numpy()
+    else:
+        hashes['merge_key_hashes'] = hashes['key_hashes']
+    return hashes
+
+def new_stream_state(dtypes, column_limit=None):
+    """
+    Create the accumulators for one file in streaming mode; every column keeps its exact distinct hashes
+    and numeric values until they take more than column_limit bytes (all columns are sketched in sketch mode)
+    """
+    state = {
+        'rows': 0,
+        'dtypes': dtypes,
+        'column_limit': column_limit,
+        'sketched': set(),
+        'nulls': {col: 0 for col in dtypes},
+        'empties': {col: 0 for col in dtypes},
+        'spaces': {col: 0 for col in dtypes},
+        # Exact columns keep a list of distinct hash arrays (merged when the unmerged part outgrows the merged one)
+        # and a list of numeric value arrays; sketched columns keep a HyperLogLog and a quantile sketch
+        'uniques': {col: [] for col in dtypes},
+        'numeric_values': {col: [] for col in dtypes},
+        'key_hashes': [],
+        'merge_key_hashes': [],
+        'row_hashes': [],
+        'digests': [],
+    }
+    if SKETCH_MODE:
+        for col in dtypes:
+            sketch_stream_column(state, col)
+    return state
+
+def merged_unique_hashes(state, col):
+    """Merge the distinct hash arrays of an exact column into one sorted array"""
+    pieces = state['uniques'][col]
+    if len(pieces) > 1:
+        state['uniques'][col] = [np.unique(np.concatenate(pieces))]
+    return state['uniques'][col][0] if state['uniques'][col] else np.array([], dtype=np.uint64)
+
+def column_state_bytes(state, col):
+    """Bytes held by the exact distinct hashes and numeric values of a column"""
+    return sum(piece.nbytes for piece in state['uniques'][col]) + sum(piece.nbytes for piece in state['numeric_values'][col])
+
+def sketch_stream_column(state, col):
+    """Replace the exact distinct hashes and numeric values of a column by a HyperLogLog and a quantile sketch"""
+    if col in state['sketched']:
+        return
+    state['uniques'][col] = add_to_distinct_sketch(new_distinct_sketch(), merged_unique_hashes(state, col))
+    values = state['numeric_values'][col]
+    state['numeric_values'][col] = add_to_quantile_sketch(new_quantile_sketch(),
+                                                          np.concatenate(values) if values else np.array([], dtype='float64'))
+    state['sketched'].add(col)
+
+def update_stream_state(state, chunk, key_columns, compare_cols):
+    """Second streaming pass: add one chunk to the per-column checks and the per-row hashes"""
+    state['rows'] += len(chunk)
+    
+    for col, dtype in state['dtypes'].items():
+        values = chunk[col]
+        non_null = values.dropna()
+        state['nulls'][col] += len(values) - len(non_null)
+        if dtype == 'object':
+            state['empties'][col] += (values == '').sum()
+            text = values.astype(str)
+            state['spaces'][col] += (text.str.len() != text.str.strip().str.len()).sum()
+        
+        sketched = col in state['sketched']
+        # Distinct values are kept as hashes (or sketched) and merged chunk by chunk
+        if len(non_null):
+            hashes = pd.util.hash_pandas_object(non_null, index=False).to_numpy()
+            if sketched:
+                merge_distinct_sketches(state['uniques'][col], add_to_distinct_sketch(new_distinct_sketch(), hashes))
+            else:
+                pieces = state['uniques'][col]
+                pieces.append(np.unique(hashes))
+                # Merging only when the unmerged arrays outgrow the merged one copies every hash a bounded number of times
+                if sum(len(piece) for piece in pieces[1:]) > len(pieces[0]):
+                    merged_unique_hashes(state, col)
+        
+        if is_stats_column(dtype):
+            if sketched:
+                chunk_sketch = add_to_quantile_sketch(new_quantile_sketch(), non_null.to_numpy(dtype='float64'))
+                merge_quantile_sketches(state['numeric_values'][col], chunk_sketch)
+            else:
+                state['numeric_values'][col].append(non_null.to_numpy(dtype='float64'))
+        
+        if not sketched and state['column_limit'] is not None and column_state_bytes(state, col) > state['column_limit']:
+            sketch_stream_column(state, col)
+    
+    # Per-row hashes for the key, duplicate and value analysis
+    if key_columns is not None:
+        hashes = hash_keyed_rows(chunk, key_columns, compare_cols)
+        for name in ['key_hashes', 'row_hashes', 'digests']:
+            state[name].append(hashes[name])
+        if len(key_columns) > 1:
+            state['merge_key_hashes'].append(hashes['merge_key_hashes'])
+
+def finish_stream_state(state):
+    """Concatenate the per-chunk hash arrays of one file"""
+    for name in ['key_hashes', 'merge_key_hashes', 'row_hashes', 'digests']:
+        state[name] = np.concatenate(state[name]) if state[name] else np.array([], dtype=np.uint64)
+    # With a single key column the merge key is the key itself
+    if len(state['merge_key_hashes']) == 0:
+        state['merge_key_hashes'] = state['key_hashes']
+    return state
+
+def find_duplicate_positions(state):
+    """Find the positions (with counts) of the first full-row and first key-based duplicate of each group"""
+    row_hashes = state['row_hashes']
+    key_hashes = state['key_hashes']
+    
+    # Full-row duplicates: first occurrence of every row hash that appears more than once
+    _, first_index, inverse, counts = np.unique(row_hashes, return_index=True, return_inverse=True, return_counts=True)
+    full_dup_mask = counts[inverse] > 1
+    full_groups = counts > 1
+    full_order = np.argsort(first_index[full_groups], kind='stable')
+    full_positions = first_index[full_groups][full_order]
+    full_counts = counts[full_groups][full_order]
+    
+    # Key-based duplicates: rows sharing a key that are not full-row duplicates, counted per key
+    _, key_inverse, key_group_counts = np.unique(key_hashes, return_inverse=True, return_counts=True)
+    key_dup_positions = np.flatnonzero((key_group_counts[key_inverse] > 1) & ~full_dup_mask)
+    _, first_key_index, dup_counts = np.unique(key_hashes[key_dup_positions], return_index=True, return_counts=True)
+    key_order = np.argsort(first_key_index, kind='stable')
+    key_positions = key_dup_positions[first_key_index][key_order]
+    key_counts = dup_counts[key_order]
+    
+    return full_positions, full_counts, key_positions, key_counts
+
+def analyze_keyed_rows(hashes1, hashes2):
+    """Find the positions of the rows to report: duplicates (with counts), missing/extra records and value candidates"""
+    full_positions1, full_counts1, key_positions1, key_counts1 = find_duplicate_positions(hashes1)
+    full_positions2, full_counts2, key_positions2, key_counts2 = find_duplicate_positions(hashes2)
+    value_positions1, value_positions2 = find_value_candidates(hashes1, hashes2)
+    return {
+        'file1': {'full': full_positions1, 'key': key_positions1,
+                  'other': np.flatnonzero(~np.isin(hashes1['key_hashes'], hashes2['key_hashes'])),
+                  'values': value_positions1},
+        'file2': {'full': full_positions2, 'key': key_positions2,
+                  'other': np.flatnonzero(~np.isin(hashes2['key_hashes'], hashes1['key_hashes'])),
+                  'values': value_positions2},
+        'counts1': {'full': full_counts1, 'key': key_counts1},
+        'counts2': {'full': full_counts2, 'key': key_counts2},
+    }
+
+def find_value_candidates(state1, state2):
+    """Positions of the first record of every key found in both files whose compared values differ"""
+    keys1, first1 = np.unique(state1['merge_key_hashes'], return_index=True)
+    keys2, first2 = np.unique(state2['merge_key_hashes'], return_index=True)
+    _, idx1, idx2 = np.intersect1d(keys1, keys2, assume_unique=True, return_indices=True)
+    positions1 = first1[idx1]
+    positions2 = first2[idx2]
+    differs = state1['digests'][positions1] != state2['digests'][positions2]
+    return np.sort(positions1[differs]), np.sort(positions2[differs])
+
+def iter_selected_rows(file_path, chunk_rows, dtypes, selections):
+    """Third streaming pass: yield the rows at the given (sorted) positions chunk by chunk, with their selection's name"""
+    offset = 0
+    for chunk in iter_csv_chunks(file_path, chunk_rows, dtypes):
+        end = offset + len(chunk)
+        for name, positions in selections.items():
+            lo, hi = np.searchsorted(positions, [offset, end])
+            if hi > lo:
+                yield name, chunk.iloc[positions[lo:hi] - offset]
+        offset = end
+
+def add_error_records(kept, error_records, max_entries):
+    """
+    Add the error records found in one part of the files to those kept so far, ordered by their index (the file row
+    number); only the first max_entries of each error type and source file are kept, but all of them are counted
+    """
+    for (error_type, source_file), records in error_records.groupby(['error_type', 'source_file'], sort=False):
+        group = kept.setdefault((error_type, source_file), {'pieces': [], 'total': 0})
+        group['total'] += len(records)
+        group['pieces'].append(records)
+        if max_entries is not None and sum(len(piece) for piece in group['pieces']) > max_entries:
+            group['pieces'] = [pd.concat(group['pieces']).sort_index(kind='stable').iloc[:max_entries]]
+
+def kept_error_records(kept, template):
+    """
+    The kept error records in the order and with the columns of combine_error_records (template: the empty result),
+    with the number of records of each error type, kept or not, in attrs['totals']
+    """
+    pieces = [pd.concat(kept[group]['pieces']).sort_index(kind='stable') for group in sorted(kept)]
+    error_records = pd.concat(pieces).reindex(columns=template.columns) if pieces else template.copy()
+    totals = {}
+    for (error_type, _), group in kept.items():
+        totals[error_type] = totals.get(error_type, 0) + group['total']
+    error_records.attrs['totals'] = totals
+    return error_records
+
+def add_value_mismatches(kept, mismatches, max_entries):
+    """
+    Add the value mismatches found in one part of the files ('_file1_row' holding file1 row numbers) to those kept
+    so far; only the first max_entries records of each column are kept, but all of them are counted
+    """
+    for col, mismatch_records in mismatches.items():
+        column = kept.setdefault(col, {'pieces': [], 'total': 0})
+        column['total'] += mismatch_records.attrs.get('total_mismatches', len(mismatch_records))
+        column['pieces'].append(mismatch_records)
+        if max_entries is not None and sum(len(piece) for piece in column['pieces']) > max_entries:
+            column['pieces'] = [pd.concat(column['pieces']).sort_values('_file1_row', kind='stable').iloc[:max_entries]]
+
+def kept_value_mismatches(kept, common_cols):
+    """The kept value mismatches per column in common_cols order, then in file1 order, with their totals"""
+    mismatches = {}
+    for col in common_cols:
+        if col in kept:
+            mismatch_records = pd.concat(kept[col]['pieces']).sort_values('_file1_row', kind='stable')
+            mismatch_records.attrs['total_mismatches'] = kept[col]['total']
+            mismatches[col] = mismatch_records
+    return mismatches
+
+def part_value_mismatches(values1, values2, common_cols, key_columns, max_entries=None):
+    """Value mismatches between the candidate records of one part of the files, '_file1_row' becoming file1 row numbers"""
+    mismatches = find_value_mismatches(values1, values2, common_cols, key_columns, max_entries=max_entries)
+    for col, mismatch_records in mismatches.items():
+        total = mismatch_records.attrs['total_mismatches']
+        file1_rows = values1.index.to_numpy()[mismatch_records['_file1_row'].to_numpy()]
+        mismatches[col] = mismatch_records.assign(_file1_row=file1_rows)
+        mismatches[col].attrs['total_mismatches'] = total
+    return mismatches
+
+def spill_chunk_to_buckets(chunk, key_columns, spill_path, num_buckets, side):
+    """Append the rows of a chunk to on-disk buckets by merge key hash (equal keys always land in the same bucket)"""
+    merge_keys = build_merge_key(chunk, key_columns)
+    buckets = pd.util.hash_pandas_object(merge_keys, index=False).to_numpy() % num_buckets
+    for bucket, rows in chunk.groupby(buckets, sort=False):
+        with open(os.path.join(spill_path, f"{side}_{bucket}.pkl"), "ab") as f:
+            pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_bucket(spill_path, side, bucket, template):
+    """Read back all pieces of one bucket (rows keep their original file index)"""
+    bucket_file = os.path.join(spill_path, f"{side}_{bucket}.pkl")
+    if not os.path.exists(bucket_file):
+        return template
+    
+    pieces = []
+    with open(bucket_file, "rb") as f:
+        while True:
+            try:
+                pieces.append(pickle.load(f))
+            except EOFError:
+                break
+    return pd.concat(pieces)
+
+def compare_spilled_buckets(spill_path, num_buckets, templates, common_cols, key_columns, compare_cols,
+                            max_entries=None, max_mismatches=None):
+    """
+    Run the keyed analysis one bucket pair at a time; returns the error records and the value mismatches per column,
+    in the same order as the in-memory comparison. Only the first max_entries error records of each type and
+    max_mismatches value mismatches of each column are kept (attrs hold the totals)
+    """
+    kept_errors = {}
+    kept_mismatches = {}
+    for bucket in range(num_buckets):
+        bucket1 = load_bucket(spill_path, 'file1', bucket, templates['file1'])
+        bucket2 = load_bucket(spill_path, 'file2', bucket, templates['file2'])
+        if bucket1.empty and bucket2.empty:
             continue
+        
+        positions = analyze_keyed_rows(hash_keyed_rows(bucket1, key_columns, compare_cols),
+                                       hash_keyed_rows(bucket2, key_columns, compare_cols))
+        for side, rows, side_counts in [('file1', bucket1, positions['counts1']), ('file2', bucket2, positions['counts2'])]:
+            for name in ['full', 'key', 'other']:
+                records = stream_error_records(rows.iloc[positions[side][name]], name, side, key_columns, side_counts.get(name))
+                add_error_records(kept_errors, records, max_entries)
+        
+        # Only the first record of keys whose values differ is merged and compared
+        add_value_mismatches(kept_mismatches, part_value_mismatches(
+            bucket1.iloc[positions['file1']['values']], bucket2.iloc[positions['file2']['values']],
+            common_cols, key_columns, max_mismatches), max_mismatches)
     
+    template = find_duplicates_and_missing(templates['file1'], templates['file2'], key_columns=key_columns)
+    return kept_error_records(kept_errors, template), kept_value_mismatches(kept_mismatches, common_cols)
+
+def compare_selected_rows(file_paths, chunk_rows, dtypes, templates, positions, common_cols, key_columns, spill_dir=None,
+                          max_entries=None, max_mismatches=None):
+    """
+    Third streaming pass over both files: the rows found by analyze_keyed_rows are marked as error records chunk by
+    chunk, and the candidate records of the value comparison are compared in parts of about chunk_rows records,
+    hash-partitioned by key (in on-disk buckets when there is more than one part). Returns the error records and
+    value mismatches the way compare_spilled_buckets does
+    """
+    num_buckets = max(-(-max(len(positions[side]['values']) for side in ['file1', 'file2']) // chunk_rows), 1)
+    spill_path = tempfile.mkdtemp(prefix="csv_comparison_spill_", dir=spill_dir) if num_buckets > 1 else None
     try:
-        # Find duplicates and missing records
-        error_records = find_duplicates_and_missing(df1, df2, key_columns=KEY_COLUMNS)
+        kept_errors = {}
+        candidates = {'file1': [], 'file2': []}
+        for side, side_counts in [('file1', positions['counts1']), ('file2', positions['counts2'])]:
+            for name, rows in iter_selected_rows(file_paths[side], chunk_rows, dtypes[side], positions[side]):
+                if name == 'values':
+                    if spill_path is not None:
+                        spill_chunk_to_buckets(rows, key_columns, spill_path, num_buckets, side)
+                    else:
+                        candidates[side].append(rows)
+                    continue
+                counts = side_counts[name][np.searchsorted(positions[side][name], rows.index)] if name in side_counts else None
+                add_error_records(kept_errors, stream_error_records(rows, name, side, key_columns, counts), max_entries)
         
-        # Add error records summary to results
-        if not error_records.empty:
-            results.append("\n=== ERROR RECORDS SUMMARY ===")
-            results.append(f"Total error records found: {len(error_records)}")
-            
-            # Count each type of error
-            full_duplicates = error_records[error_records['error_type'] == 'f']
-            duplicates = error_records[error_records['error_type'] == 'k']
-            missing = error_records[error_records['error_type'] == 'm']
-            extra = error_records[error_records['error_type'] == 'e']
-            
-            if not full_duplicates.empty:
-                results.append(f"\nFull-row duplicates ({len(full_duplicates)}):")
-                for _, row in full_duplicates.iterrows():
-                    record_id = get_record_identifier(row)
-                    results.append(f"  - {record_id} in {row['source_file']} (appears {row['num_errors']} times)")
-            
-            if not duplicates.empty:
-                results.append(f"\nKey-based duplicates ({len(duplicates)}):")
-                for _, row in duplicates.iterrows():
-                    record_id = get_record_identifier(row)
-                    results.append(f"  - {record_id} in {row['source_file']} (appears {row['num_errors']} times)")
-            
-            if not missing.empty:
-                results.append(f"\nMissing records in target ({len(missing)}):")
-                for _, row in missing.iterrows():
-                    record_id = get_record_identifier(row)
-                    results.append(f"  - {record_id}")
-            
-            if not extra.empty:
-                results.append(f"\nExtra records in target ({len(extra)}):")
-                for _, row in extra.iterrows():
-                    record_id = get_record_identifier(row)
-                    results.append(f"  - {record_id}")
+        kept_mismatches = {}
+        for bucket in range(num_buckets):
+            if spill_path is not None:
+                values1 = load_bucket(spill_path, 'file1', bucket, templates['file1'])
+                values2 = load_bucket(spill_path, 'file2', bucket, templates['file2'])
+            else:
+                values1 = pd.concat(candidates['file1']) if candidates['file1'] else templates['file1']
+                values2 = pd.concat(candidates['file2']) if candidates['file2'] else templates['file2']
+            add_value_mismatches(kept_mismatches, part_value_mismatches(values1, values2, common_cols, key_columns, max_mismatches),
+                                 max_mismatches)
+    finally:
+        if spill_path is not None:
+            shutil.rmtree(spill_path, ignore_errors=True)
     
+    template = find_duplicates_and_missing(templates['file1'], templates['file2'], key_columns=key_columns)
+    return kept_error_records(kept_errors, template), kept_value_mismatches(kept_mismatches, common_cols)
+
+def stream_error_records(rows, selection, source_file, key_columns, counts=None):
+    """
+    Mark the rows of one selection ('full', 'key' or 'other' records, with the duplicate counts of the first two)
+    as error records the way find_duplicates_and_missing does; the rows keep their index
+    """
+    records = rows.copy()
+    if selection == 'full':
+        # Groups with nulls are dropped when counting, so they do not show up as duplicates
+        records['num_errors'] = counts
+        records = records[rows.notna().all(axis=1).to_numpy()]
+        records['source_file'] = source_file
+        records['error_type'] = 'f'
+    elif selection == 'key':
+        records['source_file'] = source_file
+        records['num_errors'] = counts
+        records = records[rows[key_columns].notna().all(axis=1).to_numpy()]
+        records['error_type'] = 'k'
+    else:
+        records['source_file'] = source_file
+        records['error_type'] = 'm' if source_file == 'file1' else 'e'
+        records['num_errors'] = 1
+    return records
+
+def stream_state_profile(state):
+    """Turn the accumulators of one file into the same profile that profile_columns builds"""
+    profile = {
+        'rows': state['rows'],
+        'dtypes': state['dtypes'],
+        'nulls': state['nulls'],
+        'empties': state['empties'],
+        'spaces': state['spaces'],
+        'unique': {},
+        'unique_error': {},
+        'stats': {},
+        'quantile_sketches': {},
+    }
+    for col, dtype in state['dtypes'].items():
+        if col in state['sketched']:
+            profile['unique'][col] = distinct_estimate(state['uniques'][col])
+            profile['unique_error'][col] = distinct_error(state['uniques'][col])
+            if is_stats_column(dtype):
+                profile['quantile_sketches'][col] = state['numeric_values'][col]
+                profile['stats'][col] = sketch_describe(state['numeric_values'][col])
+        else:
+            profile['unique'][col] = len(merged_unique_hashes(state, col))
+            if is_stats_column(dtype):
+                values = state['numeric_values'][col]
+                profile['stats'][col] = pd.Series(np.concatenate(values) if values else [], dtype='float64').describe()
+    return profile
+
+def stream_state_profiles(state1, state2):
+    """Profiles of both files; a column sketched in one file is sketched in the other too, so the two compare alike"""
+    for col in state1['sketched'] | state2['sketched']:
+        for state in (state1, state2):
+            if col in state['dtypes']:
+                sketch_stream_column(state, col)
+    return stream_state_profile(state1), stream_state_profile(state2)
+
+def streaming_csv_comparison(file1_path, file2_path, key_columns=None, memory_budget_mb=None, chunk_rows=None,
+                             spill_buckets=None, spill_dir=None, report=None, mismatch_file=None):
+    """
+    Chunked version of enhanced_csv_comparison for files larger than memory:
+    produces the same report and error records while holding only one chunk of each file at a time.
+    With spill_buckets > 0 the keyed analysis runs out of core, one on-disk bucket pair at a time;
+    with a report sink and a mismatch_file the report and value mismatches are written as in enhanced_csv_comparison
+    """
+    if key_columns is None:
+        key_columns = KEY_COLUMNS
+    if isinstance(key_columns, str):
+        key_columns = [key_columns]
+    if spill_buckets is None:
+        spill_buckets = SPILL_BUCKETS
+    if spill_dir is None:
+        spill_dir = SPILL_DIR
+    
+    try:
+        if chunk_rows is None:
+            chunk_rows = chunk_rows_for_budget([file1_path, file2_path], memory_budget_mb)
+        print(f"Streaming mode: reading {chunk_rows} rows per chunk")
+        # Declared dtypes and column selection apply here too; the parser is always the chunked default one
+        options1 = csv_read_options(file1_path, key_columns=key_columns, engine="c")
+        options2 = csv_read_options(file2_path, key_columns=key_columns, engine="c")
+        dtypes1 = resolve_csv_dtypes(file1_path, chunk_rows, options1.get('usecols'), options1.get('dtype'))
+        dtypes2 = resolve_csv_dtypes(file2_path, chunk_rows, options2.get('usecols'), options2.get('dtype'))
+        template1 = pd.read_csv(file1_path, nrows=0, usecols=list(dtypes1), dtype=dtypes1)
+        template2 = pd.read_csv(file2_path, nrows=0, usecols=list(dtypes2), dtype=dtypes2)
+        header1 = pd.read_csv(file1_path, nrows=0)
+        header2 = pd.read_csv(file2_path, nrows=0)
     except Exception as e:
-        print(f"Detailed error in duplicate/missing record detection: {str(e)}")
-        results.append("\n=== ERROR FINDING DUPLICATES/MISSING RECORDS ===")
-        results.append(f"Error: {str(e)}")
+        # With a report sink the error goes to the caller, so a failed run does not leave a report that looks complete
+        if report is not None:
+            raise
+        return f"Error reading files: {str(e)}", None
+    
+    common_cols = list(set(template1.columns).intersection(set(template2.columns)))
+    keys_found = all(col in template1.columns and col in template2.columns for col in key_columns)
+    compare_cols = sorted(col for col in common_cols if col not in key_columns)
+    text_cols = [col for col in common_cols if dtypes1[col] == 'object' and dtypes2[col] == 'object']
+    
+    spill_path = None
+    if spill_buckets and keys_found:
+        spill_path = tempfile.mkdtemp(prefix="csv_comparison_spill_", dir=spill_dir)
+    try:
+        # Read both files side by side so the case check can compare rows by position
+        column_limit = column_state_limit(len(dtypes1) + len(dtypes2), memory_budget_mb)
+        state1 = new_stream_state(dtypes1, column_limit)
+        state2 = new_stream_state(dtypes2, column_limit)
+        case_diffs = {col: 0 for col in text_cols}
+        chunks1 = iter_csv_chunks(file1_path, chunk_rows, dtypes1)
+        chunks2 = iter_csv_chunks(file2_path, chunk_rows, dtypes2)
+        # With spill buckets the per-row hashes are computed bucket by bucket instead of for the whole file
+        stream_keys = key_columns if keys_found and spill_path is None else None
+        while True:
+            chunk1 = next(chunks1, None)
+            chunk2 = next(chunks2, None)
+            if chunk1 is None and chunk2 is None:
+                break
+            if chunk1 is not None:
+                update_stream_state(state1, chunk1, stream_keys, compare_cols)
+                if spill_path is not None:
+                    spill_chunk_to_buckets(chunk1, key_columns, spill_path, spill_buckets, 'file1')
+            if chunk2 is not None:
+                update_stream_state(state2, chunk2, stream_keys, compare_cols)
+                if spill_path is not None:
+                    spill_chunk_to_buckets(chunk2, key_columns, spill_path, spill_buckets, 'file2')
+            if chunk1 is not None and chunk2 is not None and len(chunk1) == len(chunk2):
+                for col in text_cols:
+                    lower1 = chunk1[col].astype(str).str.lower().to_numpy()
+                    lower2 = chunk2[col].astype(str).str.lower().to_numpy()
+                    case_diffs[col] += (lower1 != lower2).sum()
+        
+        # Files of different length can't be compared by position
+        if state1['rows'] != state2['rows']:
+            case_diffs = {col: 0 for col in text_cols}
+        profile1, profile2 = stream_state_profiles(state1, state2)
+        
+        # Without a report sink the report is built in memory and returned as text
+        text_report = report is None
+        if text_report:
+            report = open_report()
+        
+        # Add timestamp and file information header
+        write_report(report, [get_timestamp_header(file1_path, file2_path)])
+        
+        # Basic checks and column checks
+        write_report(report, record_count_section(profile1, profile2))
+        write_report(report, column_analysis_section(header1, header2))
+        write_report(report, data_type_section(common_cols, profile1, profile2))
+        write_report(report, null_value_section(common_cols, profile1, profile2))
+        write_report(report, format_consistency_section(common_cols, profile1, profile2, case_diffs))
+        
+        # Keyed analysis: pull back only the rows that will be reported. Only the records the report lists are kept
+        # (all value mismatches with a mismatch_file), so memory does not grow with the number of differences
         error_records = None
+        error_lines = []
+        if keys_found:
+            templates = {'file1': template1, 'file2': template2}
+            max_mismatches = REPORT_MAX_ENTRIES if mismatch_file is None else None
+            if spill_path is not None:
+                error_records, mismatches = compare_spilled_buckets(
+                    spill_path, spill_buckets, templates, common_cols, key_columns, compare_cols,
+                    REPORT_MAX_ENTRIES, max_mismatches)
+            else:
+                positions = analyze_keyed_rows(finish_stream_state(state1), finish_stream_state(state2))
+                error_records, mismatches = compare_selected_rows(
+                    {'file1': file1_path, 'file2': file2_path}, chunk_rows, {'file1': dtypes1, 'file2': dtypes2}, templates,
+                    positions, common_cols, key_columns, spill_dir, REPORT_MAX_ENTRIES, max_mismatches)
+            if mismatch_file is not None:
+                save_value_mismatches(mismatches, key_columns, mismatch_file)
+            
+            # Value Comparison with Record Identification
+            value_text_cols = {col for col in common_cols if is_text_column(template1, template2, col)}
+            write_report(report, ["\n=== VALUE COMPARISON ==="])
+            write_report(report, format_value_mismatches(mismatches, value_text_cols))
+            error_lines = error_records_summary(error_records)
+        else:
+            # Report missing key columns the same way the in-memory comparison does
+            write_report(report, ["\n=== VALUE COMPARISON ==="])
+            write_report(report, compare_values_with_identification(template1, template2, common_cols, key_columns=key_columns))
+            try:
+                find_duplicates_and_missing(template1, template2, key_columns=key_columns)
+            except Exception as e:
+                error_lines = ["\n=== ERROR FINDING DUPLICATES/MISSING RECORDS ===", f"Error: {str(e)}"]
+        
+        # Statistical comparison, error records summary and value distribution
+        write_report(report, statistical_section(common_cols, profile1, profile2))
+        write_report(report, error_lines)
+        write_report(report, value_distribution_section(common_cols, profile1, profile2))
+        
+        return (close_report(report) if text_report else None), error_records
+    finally:
+        if spill_path is not None:
+            shutil.rmtree(spill_path, ignore_errors=True)
+
+# ================================================================
+# SORT-MERGE MODE - compare files that are already sorted by the key columns
+# ================================================================
+# After the dtype pass, both files are read once more in chunks and merge-joined on the key as the rows come in.
+# Key groups below the smallest key either file is still reading are complete, so they are compared right away;
+# memory holds a chunk of each file plus the rows of key groups that continue into the next chunk.
+# Unsorted input (or keys that can't be ordered) stops the comparison with an error instead of a wrong report.
+
+def first_unsorted_row(keys, previous_key=None):
+    """
+    Position of the first row whose key is smaller than the key of the row before it (None when the keys are sorted);
+    previous_key is the last key of the chunk before, so the order is also checked across chunks
+    """
+    columns = [keys[col].to_numpy(dtype=object) for col in keys.columns]
+    if previous_key is not None:
+        columns = [np.concatenate([[value], values]) for value, values in zip(previous_key, columns)]
     
-    # Value Distribution Analysis (moved to end)
-    results.append("\n=== VALUE DISTRIBUTION ===")
-    for col in common_cols:
+    # Keys are ordered column by column: a later column only decides when the earlier ones are equal
+    descending = np.zeros(max(len(columns[0]) - 1, 0), dtype=bool)
+    equal = np.ones(len(descending), dtype=bool)
+    for values in columns:
+        descending |= equal & (values[1:] < values[:-1])
+        equal &= values[1:] == values[:-1]
+    
+    if not descending.any():
+        return None
+    return int(np.argmax(descending)) + (0 if previous_key is not None else 1)
+
+def check_sorted_chunk(chunk, key_columns, previous_key, file_path):
+    """Fail loudly when the keys of a chunk are not in ascending order; returns the last key of the chunk"""
+    file_name = os.path.basename(file_path)
+    keys = chunk[key_columns]
+    empty_keys = keys.isna().any(axis=1).to_numpy()
+    if empty_keys.any():
+        raise ValueError(f"{file_name} has an empty key value on row {chunk.index[empty_keys][0] + 1}; "
+                         "--presorted needs a key value on every row")
+    try:
+        position = first_unsorted_row(keys, previous_key)
+    except TypeError:
+        raise ValueError(f"{file_name} has key values of different types that can't be ordered; run without --presorted")
+    if position is not None:
+        raise ValueError(f"{file_name} is not sorted by {key_columns}: row {chunk.index[position] + 1} has a smaller key "
+                         "than the row before it; sort both files by the key columns or run without --presorted")
+    return tuple(keys.iloc[-1])
+
+def rows_below_key(df, key_columns, boundary):
+    """Number of leading rows of a frame sorted by key whose key is smaller than the boundary key"""
+    below = np.zeros(len(df), dtype=bool)
+    equal = np.ones(len(df), dtype=bool)
+    for col, value in zip(key_columns, boundary):
+        values = df[col].to_numpy(dtype=object)
+        below |= equal & (values < value)
+        equal &= values == value
+    return int(below.sum())
+
+def presorted_csv_comparison(file1_path, file2_path, key_columns=None, memory_budget_mb=None, chunk_rows=None,
+                             report=None, mismatch_file=None):
+    """
+    Sort-merge version of streaming_csv_comparison for files already sorted by the key columns:
+    the files are merge-joined in one sequential pass and every key group is compared once it is complete,
+    producing the same report and error records. Raises ValueError when a file turns out not to be sorted
+    """
+    if key_columns is None:
+        key_columns = KEY_COLUMNS
+    if isinstance(key_columns, str):
+        key_columns = [key_columns]
+    
+    try:
+        if chunk_rows is None:
+            chunk_rows = chunk_rows_for_budget([file1_path, file2_path], memory_budget_mb)
+        print(f"Sort-merge mode: reading {chunk_rows} rows per chunk")
+        options1 = csv_read_options(file1_path, key_columns=key_columns, engine="c")
+        options2 = csv_read_options(file2_path, key_columns=key_columns, engine="c")
+        dtypes1 = resolve_csv_dtypes(file1_path, chunk_rows, options1.get('usecols'), options1.get('dtype'))
+        dtypes2 = resolve_csv_dtypes(file2_path, chunk_rows, options2.get('usecols'), options2.get('dtype'))
+        template1 = pd.read_csv(file1_path, nrows=0, usecols=list(dtypes1), dtype=dtypes1)
+        template2 = pd.read_csv(file2_path, nrows=0, usecols=list(dtypes2), dtype=dtypes2)
+        header1 = pd.read_csv(file1_path, nrows=0)
+        header2 = pd.read_csv(file2_path, nrows=0)
+    except Exception as e:
+        # With a report sink the error goes to the caller, so a failed run does not leave a report that looks complete
+        if report is not None:
+            raise
+        return f"Error reading files: {str(e)}", None
+    
+    for col in key_columns:
+        if col not in template1.columns or col not in template2.columns:
+            raise ValueError(f"Key column '{col}' not found in both files")
+    common_cols = list(set(template1.columns).intersection(set(template2.columns)))
+    compare_cols = sorted(col for col in common_cols if col not in key_columns)
+    text_cols = [col for col in common_cols if dtypes1[col] == 'object' and dtypes2[col] == 'object']
+    
+    sides = {}
+    column_limit = column_state_limit(len(dtypes1) + len(dtypes2), memory_budget_mb)
+    for name, file_path, dtypes, template in [('file1', file1_path, dtypes1, template1), ('file2', file2_path, dtypes2, template2)]:
+        sides[name] = {
+            'path': file_path,
+            'chunks': iter_csv_chunks(file_path, chunk_rows, dtypes),
+            'state': new_stream_state(dtypes, column_limit),
+            'buffer': template,   # rows of key groups that are not complete yet
+            'last_key': None,     # last key read so far
+            'done': False,
+            'lower': pd.DataFrame({col: pd.Series(dtype=object) for col in text_cols}),  # for the case check by position
+        }
+    case_diffs = {col: 0 for col in text_cols}
+    # Only the records the report lists are kept (all value mismatches with a mismatch_file), with their totals;
+    # error records are numbered in the order they are found, which is file order
+    max_mismatches = REPORT_MAX_ENTRIES if mismatch_file is None else None
+    kept_errors = {}
+    kept_mismatches = {}
+    errors_found = 0
+    file1_rows = 0
+    
+    while not all(side['done'] for side in sides.values()):
+        # Read on in the file(s) whose keys are furthest behind
+        reading = [side for side in sides.values() if not side['done']]
         try:
-            unique1 = df1[col].nunique()
-            unique2 = df2[col].nunique()
-            if unique1 != unique2:
-                results.append(f"Different number of unique values in '{col}':")
-                results.append(f"  File1: {unique1} unique values")
-                results.append(f"  File2: {unique2} unique values")
-        except Exception as e:
-            print(f"Error in value distribution analysis for column {col}: {str(e)}")
-            continue
+            lagging = min(side['last_key'] for side in reading if side['last_key'] is not None) \
+                if all(side['last_key'] is not None for side in reading) else None
+        except TypeError:
+            raise ValueError("The key columns have different types in the two files; run without --presorted")
+        for side in reading:
+            if lagging is not None and side['last_key'] != lagging:
+                continue
+            chunk = next(side['chunks'], None)
+            if chunk is None:
+                side['done'] = True
+                continue
+            side['last_key'] = check_sorted_chunk(chunk, key_columns, side['last_key'], side['path'])
+            update_stream_state(side['state'], chunk, None, compare_cols)
+            side['buffer'] = pd.concat([side['buffer'], chunk])
+            lower = pd.DataFrame({col: chunk[col].astype(str).str.lower().to_numpy() for col in text_cols})
+            side['lower'] = pd.concat([side['lower'], lower], ignore_index=True)
+        
+        # Compare the text columns by position as far as both files have been read
+        lower1, lower2 = sides['file1']['lower'], sides['file2']['lower']
+        overlap = min(len(lower1), len(lower2))
+        for col in text_cols:
+            case_diffs[col] += (lower1[col].to_numpy()[:overlap] != lower2[col].to_numpy()[:overlap]).sum()
+        sides['file1']['lower'] = lower1.iloc[overlap:].reset_index(drop=True)
+        sides['file2']['lower'] = lower2.iloc[overlap:].reset_index(drop=True)
+        
+        # Key groups below the smallest key still being read are complete in both files
+        open_keys = [side['last_key'] for side in sides.values() if not side['done']]
+        ready = {}
+        for name, side in sides.items():
+            count = rows_below_key(side['buffer'], key_columns, min(open_keys)) if open_keys else len(side['buffer'])
+            ready[name] = side['buffer'].iloc[:count]
+            side['buffer'] = side['buffer'].iloc[count:]
+        if len(ready['file1']) or len(ready['file2']):
+            errors = find_duplicates_and_missing(ready['file1'], ready['file2'], key_columns=key_columns)
+            errors.index = np.arange(errors_found, errors_found + len(errors))
+            errors_found += len(errors)
+            add_error_records(kept_errors, errors, REPORT_MAX_ENTRIES)
+            mismatches = find_value_mismatches(ready['file1'], ready['file2'], common_cols, key_columns, max_entries=max_mismatches)
+            for mismatch_records in mismatches.values():
+                mismatch_records['_file1_row'] += file1_rows
+            add_value_mismatches(kept_mismatches, mismatches, max_mismatches)
+            file1_rows += len(ready['file1'])
+    
+    # Files of different length can't be compared by position
+    state1, state2 = sides['file1']['state'], sides['file2']['state']
+    if state1['rows'] != state2['rows']:
+        case_diffs = {col: 0 for col in text_cols}
+    profile1, profile2 = stream_state_profiles(state1, state2)
+    
+    # Key groups were compared in key order, which is file order for sorted files
+    error_records = kept_error_records(kept_errors, find_duplicates_and_missing(template1, template2, key_columns=key_columns))
+    mismatches = kept_value_mismatches(kept_mismatches, common_cols)
+    if mismatch_file is not None:
+        save_value_mismatches(mismatches, key_columns, mismatch_file)
+    
+    # Without a report sink the report is built in memory and returned as text
+    text_report = report is None
+    if text_report:
+        report = open_report()
+    
+    # Add timestamp and file information header
+    write_report(report, [get_timestamp_header(file1_path, file2_path)])
+    
+    # Basic checks and column checks
+    write_report(report, record_count_section(profile1, profile2))
+    write_report(report, column_analysis_section(header1, header2))
+    write_report(report, data_type_section(common_cols, profile1, profile2))
+    write_report(report, null_value_section(common_cols, profile1, profile2))
+    write_report(report, format_consistency_section(common_cols, profile1, profile2, case_diffs))
     
-    return "\n".join(results), error_records
+    # Value Comparison with Record Identification
+    write_report(report, ["\n=== VALUE COMPARISON ==="])
+    value_text_cols = {col for col in common_cols if is_text_column(template1, template2, col)}
+    write_report(report, format_value_mismatches(mismatches, value_text_cols))
+    
+    # Statistical comparison, error records summary and value distribution
+    write_report(report, statistical_section(common_cols, profile1, profile2))
+    write_report(report, error_records_summary(error_records))
+    write_report(report, value_distribution_section(common_cols, profile1, profile2))
+    
+    return (close_report(report) if text_report else None), error_records
 
 def find_csv_files():
     """Find CSV files in the specified directory; If can't find 2 files, raise an error"""
@@ -492,36 +2710,120 @@ def find_csv_files():
     
     return csv_files
 
+def parse_args():
+    """Command line options; defaults come from the configuration at the top of this file"""
+    parser = argparse.ArgumentParser(description="Compare two CSV files for data quality issues and differences")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="number of processes for the per-column checks (default: %(default)s)")
+    parser.add_argument("--engine", choices=["c", "pyarrow", "parallel", "python"], default=CSV_ENGINE,
+                        help="CSV parser; pyarrow is multithreaded, parallel splits a memory-mapped file over processes "
+                             "(default: %(default)s)")
+    parser.add_argument("--incremental", action="store_true", default=INCREMENTAL,
+                        help="report only value changes since the previous run (keeps a state file next to the results)")
+    parser.add_argument("--columnar", choices=["parquet", "arrow"], default=COLUMNAR_FORMAT,
+                        help="also write value mismatches and error records as Parquet or Arrow IPC files")
+    parser.add_argument("--max-entries", type=int, default=REPORT_MAX_ENTRIES,
+                        help="list at most this many records per report section; the rest is counted (default: all)")
+    parser.add_argument("--sketch", action="store_true", default=SKETCH_MODE,
+                        help="approximate distinct counts and quartiles with fixed-size sketches (for huge columns)")
+    parser.add_argument("--quick", action="store_true",
+                        help="only run a quick check on a key sample of both files; exits with status 1 when they differ")
+    parser.add_argument("--sample-rate", type=float, default=QUICK_SAMPLE_RATE,
+                        help="share of the keys sampled by --quick (default: %(default)s)")
+    parser.add_argument("--presorted", action="store_true", default=PRESORTED,
+                        help="both files are sorted by the key columns: compare them in one sort-merge pass")
+    parser.add_argument("--profile", action="store_true", default=PROFILE_RUN,
+                        help="save wall time, CPU time, memory and rows per phase as a JSON run profile next to the results")
+    parser.add_argument("--quiet", action="store_true", default=not ECHO_REPORT,
+                        help="only write the results file, without printing the report to the console")
+    return parser.parse_args()
+
 def main():
+    global CSV_ENGINE, SKETCH_MODE, REPORT_MAX_ENTRIES
+    args = parse_args()
+    CSV_ENGINE = args.engine
+    REPORT_MAX_ENTRIES = args.max_entries
+    SKETCH_MODE = args.sketch
     try:
         # Find CSV files
         print(f"Looking for CSV files in: {CSV_DIR}")
         file1, file2 = find_csv_files()
         
+        # The quick check only prints its verdict; the exit status tells a pipeline whether to run the full comparison
+        # (0 = no differences found, 1 = differences found, 2 = the check could not run or sampled nothing)
+        if args.quick:
+            quick_report, estimates = quick_csv_comparison(file1, file2, sample_rate=args.sample_rate)
+            print(quick_report)
+            if estimates is None or estimates['unknown']:
+                sys.exit(2)
+            if estimates['different']:
+                sys.exit(1)
+            return
+        
         # Get output filenames
         results_filename, errors_filename = get_output_filenames(file1, file2)
         
-        # Compare files
-        print("\nStarting comparison...")
-        result, error_records = enhanced_csv_comparison(file1, file2)
+        mismatch_file = columnar_errors_file = None
+        if args.columnar:
+            mismatch_filename, columnar_errors_filename = get_columnar_filenames(file1, file2, args.columnar)
+            mismatch_file = os.path.join(CSV_DIR, mismatch_filename)
+            columnar_errors_file = os.path.join(CSV_DIR, columnar_errors_filename)
         
-        # Save comparison results to text file
+        # The report is written section by section while the comparison runs, to a partial file that replaces the
+        # results file once the comparison succeeds (a failed run leaves the previous results in place)
         output_text_file = os.path.join(CSV_DIR, results_filename)
-        with open(output_text_file, "w") as f:
-            f.write(result)
+        partial_text_file = output_text_file + ".partial"
+        report = open_report(partial_text_file, max_section_entries=args.max_entries, echo=not args.quiet)
+        
+        if args.profile:
+            start_run_profile()
+        
+        # Compare files
+        print("\nStarting comparison...")
+        if not args.quiet:
+            print("\nComparison Results:")
+        try:
+            if args.presorted:
+                _, error_records = presorted_csv_comparison(file1, file2, report=report, mismatch_file=mismatch_file)
+            elif STREAMING_MODE:
+                _, error_records = streaming_csv_comparison(file1, file2, report=report, mismatch_file=mismatch_file)
+            else:
+                state_file = os.path.join(CSV_DIR, get_state_filename(file1, file2)) if args.incremental else None
+                _, error_records = enhanced_csv_comparison(file1, file2, workers=args.workers, state_file=state_file,
+                                                           report=report, mismatch_file=mismatch_file)
+        except BaseException:
+            close_report(report)
+            os.remove(partial_text_file)
+            raise
+        close_report(report)
+        os.replace(partial_text_file, output_text_file)
         
         # Save error records to CSV if any were found
         if error_records is not None and not error_records.empty:
             output_csv_file = os.path.join(CSV_DIR, errors_filename)
-            error_records.to_csv(output_csv_file, index=False)
+            with measure_phase("save_error_records", rows=len(error_records)):
+                error_records.to_csv(output_csv_file, index=False)
             print(f"\nError records have been saved to: {output_csv_file}")
+            if columnar_errors_file is not None:
+                try:
+                    write_columnar(error_records, columnar_errors_file)
+                    print(f"Error records have been saved to: {columnar_errors_file}")
+                except Exception as e:
+                    print(f"Error writing error records to {columnar_errors_file}: {str(e)}")
+        if mismatch_file is not None and os.path.exists(mismatch_file):
+            print(f"Value mismatches have been saved to: {mismatch_file}")
+        
+        if args.profile:
+            profile_file = os.path.join(CSV_DIR, get_profile_filename(file1, file2))
+            save_run_profile(finish_run_profile(), profile_file, file1, file2)
+            print(f"Run profile has been saved to: {profile_file}")
         
-        print("\nComparison Results:")
-        print(result)
         print(f"\nDetailed results have been saved to: {output_text_file}")
         
     except Exception as e:
         print(f"Error: {str(e)}")
+        # A failed comparison or quick check must not read as success to a pipeline
+        sys.exit(2)
 
 if __name__ == "__main__":
     main() 
@@ -5,32 +5,105 @@
 # 1. Copy this entire file into a Snowflake Python worksheet
 # 2. Update the configuration section below  
 # 3. Click Run
+# 4. Optional: schedule cleanup_results as a task to drop result tables older than RESULTS_TTL_HOURS (see README)
 
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import reduce
 import snowflake.snowpark as sp
-from snowflake.snowpark.functions import col, count, max
+from snowflake.snowpark.functions import col, count, lit, iff, coalesce, call_function, current_timestamp, sum as sum_
+from snowflake.snowpark.types import ByteType, DecimalType, DoubleType, FloatType, IntegerType, LongType, ShortType, StringType
 
-def main(session: sp.Session):
-    # ===== CONFIGURATION - UPDATE THESE VALUES =====
-    TABLE1_CONFIG = {
-        "database": "your_database",
-        "schema": "your_schema", 
-        "table": "table1_name"
-    }
+NUMERIC_TYPES = (ByteType, ShortType, IntegerType, LongType, DecimalType, FloatType, DoubleType)
+
+# ===== CONFIGURATION - UPDATE THESE VALUES =====
+TABLE1_CONFIG = {
+    "database": "your_database",
+    "schema": "your_schema", 
+    "table": "table1_name"
+}
+
+TABLE2_CONFIG = {
+    "database": "your_database",
+    "schema": "your_schema",
+    "table": "table2_name"
+}
+
+KEY_COLUMNS = ['employee_id']  # The column(s) that uniquely identify each record. If multiple columns, use a comma separated list.
+NORMALIZE_VALUES = True  # Compare numbers as one numeric type and other values as text, so the same value stored with different column types in the two tables matches. False compares the raw values.
+CHECKSUM_DRILL_DOWN = False  # For very large tables: compare checksums per partition first and compare records only in the partitions that do not match
+PARTITION_COLUMN = None  # Optional column that partitions both tables (e.g. a date or clustering column), e.g. 'load_date'. The drill-down starts from its values.
+CHECKSUM_BUCKETS = 64  # Number of key-hash buckets a mismatching partition is split into at each drill-down level
+CHECKSUM_ROW_LIMIT = 1000000  # Stop drilling down once the mismatching partitions hold at most this many records
+RESULTS_SCHEMA = "DEV_SILVER.DQ"  # Database.schema where the DQ views (and materialized result tables) are created
+MATERIALIZE_RESULTS = False  # Store the comparison results once in transient tables and point the DQ views at them, instead of views that re-run the comparison on every query
+RESULTS_TTL_HOURS = 24  # Result tables older than this are dropped by cleanup_results, together with the DQ views that read them (None keeps them)
+MAX_CONCURRENT_QUERIES = 8  # With MATERIALIZE_RESULTS, independent queries (record counts, result tables, views) are submitted together, at most this many at a time
+# ===== END OF CONFIGURATION =====================
+
+# Tables this script writes to RESULTS_SCHEMA (the materialized results, and one table per drill-down level), and
+# LIKE patterns matching them and the DQ views (\_ is a literal underscore)
+RESULT_TABLES = {f"{name}_RESULT" for name in ["DQ_KEY_COMPARISON", "DQ_MISSING_RECORDS_VIEW", "DQ_EXTRA_RECORDS_VIEW",
+                                               "DQ_DIFFERENT_VALUES_T1_VIEW", "DQ_DIFFERENT_VALUES_T2_VIEW",
+                                               "DQ_TABLE1_DUPLICATES_VIEW", "DQ_TABLE2_DUPLICATES_VIEW"]}
+RESULT_TABLES |= {f"DQ_DRILL_DOWN_L{level}_RESULT" for level in range(64)}
+RESULT_TABLES_PATTERN = r"DQ\_%\_RESULT"
+VIEWS_PATTERN = r"DQ\_%\_VIEW"
 
-    TABLE2_CONFIG = {
-        "database": "your_database",
-        "schema": "your_schema",
-        "table": "table2_name"
-    }
+def show_statement(kind, pattern):
+    """SHOW TABLES/VIEWS statement for the objects in RESULTS_SCHEMA whose name matches a LIKE pattern. A backslash is
+    itself an escape in a Snowflake string literal, so each one is doubled to reach LIKE unchanged"""
+    escaped = pattern.replace("\\", "\\\\")
+    return f"SHOW {kind} LIKE '{escaped}' IN SCHEMA {RESULTS_SCHEMA}"
 
-    KEY_COLUMNS = ['employee_id']  # The column(s) that uniquely identify each record. If multiple columns, use a comma separated list.
-    # ===== END OF CONFIGURATION =====================
+def cleanup_results(session: sp.Session):
+    """Drop the result tables older than RESULTS_TTL_HOURS and the DQ views that read from them, so no view is left
+    pointing at a dropped table. A comparison run replaces the tables it writes, so tables only expire while no runs
+    happen: this runs on its own, e.g. as a scheduled task (see README)"""
+    dropped = []
+    if RESULTS_TTL_HOURS is not None:
+        expiry = datetime.now(timezone.utc) - timedelta(hours=RESULTS_TTL_HOURS)
+        tables = session.sql(show_statement("TABLES", RESULT_TABLES_PATTERN)).collect()
+        expired_tables = [table["name"] for table in tables if table["name"] in RESULT_TABLES and table["created_on"] < expiry]
+        if expired_tables:
+            # A view reads an expired table when its definition names the table
+            views = session.sql(show_statement("VIEWS", VIEWS_PATTERN)).collect()
+            dropped += [("VIEW", view["name"]) for view in views
+                        if any(re.search(rf"\b{table}\b", view["text"] or "", re.IGNORECASE) for table in expired_tables)]
+            dropped += [("TABLE", name) for name in expired_tables]
     
+    for kind, name in dropped:
+        session.sql(f'DROP {kind} IF EXISTS {RESULTS_SCHEMA}."{name}"').collect()
+    return session.create_dataframe(dropped or [("NONE", "")], schema=["DROPPED", "NAME"])
+
+def main(session: sp.Session):
     # Table names from configuration values
     TABLE1 = f'"{TABLE1_CONFIG["database"]}"."{TABLE1_CONFIG["schema"]}"."{TABLE1_CONFIG["table"]}"'
     TABLE2 = f'"{TABLE2_CONFIG["database"]}"."{TABLE2_CONFIG["schema"]}"."{TABLE2_CONFIG["table"]}"'
 
     try:
+        # With materialized results, independent queries are submitted together and awaited together (on the same
+        # session, from a bounded pool), so each step takes about as long as its slowest query instead of the sum of
+        # all of them. Lazy views are only DDL statements plus a few small queries, so they run one after another
+        def run_concurrently(*tasks):
+            if not MATERIALIZE_RESULTS or MAX_CONCURRENT_QUERIES <= 1:
+                return [task() for task in tasks]
+            with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_QUERIES) as executor:
+                return list(executor.map(lambda task: task(), tasks))
+        
+        def save_table(df, name):
+            table_name = f"{RESULTS_SCHEMA}.{name}"
+            df.write.save_as_table(table_name, mode="overwrite", table_type="transient")
+            return session.table(table_name)
+        
+        # Results are either evaluated once into a transient table (and read from there), or left lazy
+        def materialize(df, name):
+            return save_table(df, f"{name}_RESULT") if MATERIALIZE_RESULTS else df
+        
+        def publish(df, view_name):
+            materialize(df, view_name).create_or_replace_view(f"{RESULTS_SCHEMA}.{view_name}")
+        
         # Read tables
         df1 = session.table(TABLE1)
         df2 = session.table(TABLE2)
@@ -38,15 +111,18 @@ def main(session: sp.Session):
         # Initialize variables
         missing_count = 0
         extra_count = 0
+        null_key_count1 = 0
+        null_key_count2 = 0
         different_values_count = 0
+        drill_down_levels = None
+        drill_down_records = None
         missing_in_2 = None
         extra_in_2 = None
         different_records_table1 = None
         different_records_table2 = None
-
-        # Record count
-        count1 = df1.count()
-        count2 = df2.count()
+        dup1 = None
+        dup2 = None
+        comparison_time = session.range(1).select(current_timestamp())
 
         # Column-names analysis
         cols1 = set(df1.columns) 
@@ -54,75 +130,163 @@ def main(session: sp.Session):
         common_cols = cols1.intersection(cols2)
         missing_cols = cols1 - cols2
         extra_cols = cols2 - cols1
+        
+        # Common columns compared between records with the same key (all common columns except the key columns)
+        key_names = {key.upper() for key in KEY_COLUMNS}
+        compare_cols = sorted(c for c in common_cols if c.upper() not in key_names)
 
-        # Duplication analysis (aggragate by key columns and count the number of records)
         if KEY_COLUMNS:
-            try:
-                dup1 = df1.group_by(*KEY_COLUMNS).agg(count("*").alias("count")).filter(col("count") > 1)
-                dup2 = df2.group_by(*KEY_COLUMNS).agg(count("*").alias("count")).filter(col("count") > 1)
-                dup1_count = dup1.count()
-                dup2_count = dup2.count()
-            except Exception as e: # If there is an error, set the duplicate counts to -1 (for debugging purposes)
-                dup1_count = -1
-                dup2_count = -1
-        else:  # If no key columns are specified, set the duplicate counts to -2 (for debugging purposes)
-            dup1_count = -2
-            dup2_count = -2 
-
-        # Missing and extrarecords analysis (based on key columns match)        
-        try:
-            # Distinct records
-            df1_keys = df1.select(*KEY_COLUMNS).distinct()
-            df2_keys = df2.select(*KEY_COLUMNS).distinct()
+            # Per-row digest of the (normalized) compared values, so records are compared by key and hash instead of
+            # by set operations over every common column
+            # Numbers are cast to one numeric type for both tables (DOUBLE if either side is floating point, otherwise
+            # NUMBER(38, s) with the larger scale), so e.g. NUMBER(10,2) 1.50 and FLOAT 1.5 match; other values are cast to text
+            types1 = {field.name: field.datatype for field in df1.schema.fields}
+            types2 = {field.name: field.datatype for field in df2.schema.fields}
+            
+            def normalized_type(name):
+                type1, type2 = types1[name], types2[name]
+                if not (isinstance(type1, NUMERIC_TYPES) and isinstance(type2, NUMERIC_TYPES)):
+                    return StringType()
+                if isinstance(type1, (FloatType, DoubleType)) or isinstance(type2, (FloatType, DoubleType)):
+                    return DoubleType()
+                return DecimalType(38, max(getattr(type1, "scale", 0), getattr(type2, "scale", 0)))
+            
+            def with_row_digest(df):
+                values = [col(c).cast(normalized_type(c)) if NORMALIZE_VALUES else col(c) for c in compare_cols]
+                return df.with_column("ROW_DIGEST", call_function("HASH", *values) if values else lit(0))
             
-            # Count distinct records
-            df1_keys_count = df1_keys.count()
-            df2_keys_count = df2_keys.count()
+            rows1 = with_row_digest(df1)
+            rows2 = with_row_digest(df2)
             
-            missing_keys = df1_keys.join(df2_keys, KEY_COLUMNS, "left_anti")  # Records in table1 not in table2
-            extra_keys = df2_keys.join(df1_keys, KEY_COLUMNS, "left_anti") # Records in table2 not in table1
-           
-            # Missing and extra records and count them
-            if missing_keys.count() > 0: # Records in table1 not in table2
-                missing_in_2 = df1.join(missing_keys, KEY_COLUMNS, "inner")
-                missing_count = missing_in_2.count()
-            else:
-                missing_count = 0
-                missing_in_2 = None
+            # Checksum drill-down: compare the record count and the sum of row hashes per partition on both tables, then split
+            # only the mismatching partitions into finer key-hash buckets (level n uses HASH(key) % CHECKSUM_BUCKETS^n, so every
+            # bucket is a sub-bucket of one at the level above) until they are small enough to compare record by record.
+            # Matching partitions are skipped, so the cost follows how much of the tables has diverged
+            if CHECKSUM_DRILL_DOWN:
+                def with_row_checksum(rows):
+                    rows = rows.with_column("KEY_HASH", call_function("ABS", call_function("HASH", *[col(k) for k in KEY_COLUMNS])))
+                    rows = rows.with_column("ROW_CHECKSUM", call_function("HASH", col("KEY_HASH"), col("ROW_DIGEST")))
+                    return rows.with_column("PARTITION_VALUE", col(PARTITION_COLUMN) if PARTITION_COLUMN else lit(0))
+                
+                def with_bucket(rows, level):
+                    return rows.with_column("BUCKET", col("KEY_HASH") % lit(CHECKSUM_BUCKETS ** level))
+                
+                def partition_checksums(rows, prefix, level):
+                    return with_bucket(rows, level).group_by("PARTITION_VALUE", "BUCKET").agg(
+                        count("*").alias(f"{prefix}_ROWS"), sum_(col("ROW_CHECKSUM")).alias(f"{prefix}_CHECKSUM"))
                 
-            if extra_keys.count() > 0: # Records in table2 not in table1
-                extra_in_2 = df2.join(extra_keys, KEY_COLUMNS, "inner")
-                extra_count = extra_in_2.count()
-            else: 
-                extra_count = 0
-                extra_in_2 = None
+                # The checksums of each level are saved to a transient table (one per level, replaced by the next run),
+                # and the records of the mismatching (partition, bucket) pairs are selected with a join against it, so
+                # the partition and bucket lists never leave the warehouse. EQUAL_NULL also matches a NULL partition value
+                def in_scope(rows, mismatches, level):
+                    rows = with_bucket(rows, level)
+                    condition = rows["PARTITION_VALUE"].equal_null(mismatches["PARTITION_VALUE"]) & (rows["BUCKET"] == mismatches["BUCKET"])
+                    return rows.join(mismatches, condition, "leftsemi").drop("BUCKET")
+                
+                checksums1 = with_row_checksum(rows1)
+                checksums2 = with_row_checksum(rows2)
+                scoped1, scoped2 = checksums1, checksums2
+                level = 0
+                previous_records = None
+                while True:
+                    checksums = save_table(partition_checksums(scoped1, "T1", level).join(
+                        partition_checksums(scoped2, "T2", level), ["PARTITION_VALUE", "BUCKET"], "full"), f"DQ_DRILL_DOWN_L{level}_RESULT")
+                    mismatch = ~(col("T1_ROWS").equal_null(col("T2_ROWS")) & col("T1_CHECKSUM").equal_null(col("T2_CHECKSUM")))
+                    stats = checksums.agg(
+                        coalesce(sum_(col("T1_ROWS")), lit(0)).alias("COUNT1"),
+                        coalesce(sum_(col("T2_ROWS")), lit(0)).alias("COUNT2"),
+                        coalesce(sum_(iff(mismatch, 1, 0)), lit(0)).alias("MISMATCHES"),
+                        coalesce(sum_(iff(mismatch, coalesce(col("T1_ROWS"), lit(0)) + coalesce(col("T2_ROWS"), lit(0)), 0)), lit(0)).alias("RECORDS"),
+                    ).collect()[0]
+                    if level == 0:  # The first level covers every partition, so it also gives the record counts
+                        total_count1 = stats["COUNT1"]
+                        total_count2 = stats["COUNT2"]
+                    drill_down_records = stats["RECORDS"]
+                    if not stats["MISMATCHES"]:
+                        scoped1 = scoped1.filter(lit(False))
+                        scoped2 = scoped2.filter(lit(False))
+                        break
+                    mismatches = checksums.filter(mismatch).select("PARTITION_VALUE", "BUCKET")
+                    scoped1 = in_scope(checksums1, mismatches, level)
+                    scoped2 = in_scope(checksums2, mismatches, level)
+                    level += 1
+                    # Stop when the mismatching records are few enough, when splitting no longer narrows them down
+                    # (the differences are spread over every bucket), or when the buckets cannot get any finer
+                    if (drill_down_records <= CHECKSUM_ROW_LIMIT
+                            or (previous_records is not None and drill_down_records >= previous_records)
+                            or CHECKSUM_BUCKETS ** level >= 2 ** 63):
+                        break
+                    previous_records = drill_down_records
+                drill_down_levels = level
+                rows1 = scoped1
+                rows2 = scoped2
+            
+            # One-pass plan: aggregate each table by key (row count and a hash of the distinct row digests of the key's rows),
+            # FULL OUTER JOIN the two key aggregates, and compute every summary metric with conditional aggregates
+            # in a single query; each table is scanned once. The digests are grouped first, so the key digest is
+            # HASH_AGG(DISTINCT ROW_DIGEST): a key differs exactly when one table has a row digest the other lacks under
+            # that key, the same rule as the DQ_DIFFERENT_VALUES views, and duplicate rows are left to the duplicate counts
+            def key_aggregate(rows, prefix):
+                digests = rows.group_by(*KEY_COLUMNS, "ROW_DIGEST").agg(count("*").alias("DIGEST_ROWS"))
+                digest = call_function("HASH_AGG", col("ROW_DIGEST"))
+                return digests.group_by(*KEY_COLUMNS).agg(sum_(col("DIGEST_ROWS")).alias(f"{prefix}_ROWS"), digest.alias(f"{prefix}_DIGEST"))
+            
+            # The key aggregate is materialized first, so the counts and every detail view come from the same data
+            keys = materialize(key_aggregate(rows1, "T1").join(key_aggregate(rows2, "T2"), KEY_COLUMNS, "full"), "DQ_KEY_COMPARISON")
+            in_t1 = col("T1_ROWS").is_not_null()
+            in_t2 = col("T2_ROWS").is_not_null()
+            # Keys with a NULL part never match in the join (nor in the detail views), so they are counted on their own
+            has_key = reduce(lambda left, right: left & right, [col(k).is_not_null() for k in KEY_COLUMNS])
+            summary_query = keys.agg(
+                coalesce(sum_(col("T1_ROWS")), lit(0)).alias("COUNT1"),
+                coalesce(sum_(col("T2_ROWS")), lit(0)).alias("COUNT2"),
+                sum_(iff(col("T1_ROWS") > 1, 1, 0)).alias("DUP1_COUNT"),
+                sum_(iff(col("T2_ROWS") > 1, 1, 0)).alias("DUP2_COUNT"),
+                sum_(iff(in_t1 & ~in_t2 & has_key, col("T1_ROWS"), 0)).alias("MISSING_COUNT"),
+                sum_(iff(in_t2 & ~in_t1 & has_key, col("T2_ROWS"), 0)).alias("EXTRA_COUNT"),
+                sum_(iff(in_t1 & ~has_key, col("T1_ROWS"), 0)).alias("NULL_KEY1_COUNT"),
+                sum_(iff(in_t2 & ~has_key, col("T2_ROWS"), 0)).alias("NULL_KEY2_COUNT"),
+                sum_(iff(in_t1 & in_t2 & has_key & (col("T1_DIGEST") != col("T2_DIGEST")), 1, 0)).alias("DIFFERENT_COUNT"),
+            )
+            summary, comparison_time = run_concurrently(lambda: summary_query.collect()[0], lambda: comparison_time.collect()[0])
+            
+            # Record count (in drill-down mode the key aggregate only covers the mismatching partitions)
+            count1 = total_count1 if CHECKSUM_DRILL_DOWN else summary["COUNT1"]
+            count2 = total_count2 if CHECKSUM_DRILL_DOWN else summary["COUNT2"]
             
-            # Records with identical keys but different values in other (common) columns
-            if common_cols and len(common_cols) > len(KEY_COLUMNS):
-                # Select only common columns for comparison
-                common_cols_list = list(common_cols)
-                df1_common = df1.select(*common_cols_list)
-                df2_common = df2.select(*common_cols_list)
+            # Duplication analysis (key groups with more than one record) and missing/extra records (by key match)
+            dup1_count = summary["DUP1_COUNT"] or 0
+            dup2_count = summary["DUP2_COUNT"] or 0
+            missing_count = summary["MISSING_COUNT"] or 0
+            extra_count = summary["EXTRA_COUNT"] or 0
+            null_key_count1 = summary["NULL_KEY1_COUNT"] or 0
+            null_key_count2 = summary["NULL_KEY2_COUNT"] or 0
+            # Keys found in both tables whose records differ in the other common columns
+            different_values_count = summary["DIFFERENT_COUNT"] or 0
+            
+            # Detail views are derived from the same key aggregate
+            dup1 = keys.filter(col("T1_ROWS") > 1).select(*KEY_COLUMNS, col("T1_ROWS").alias("count"))
+            dup2 = keys.filter(col("T2_ROWS") > 1).select(*KEY_COLUMNS, col("T2_ROWS").alias("count"))
+            missing_in_2 = df1.join(keys.filter(in_t1 & ~in_t2 & has_key).select(*KEY_COLUMNS), KEY_COLUMNS, "leftsemi")  # Records in table1 not in table2
+            extra_in_2 = df2.join(keys.filter(in_t2 & ~in_t1 & has_key).select(*KEY_COLUMNS), KEY_COLUMNS, "leftsemi")  # Records in table2 not in table1
+            
+            # Records with identical keys but different values in other (common) columns: the wide rows are read only
+            # for keys whose digests differ, and rows whose digest also appears under the same key in the other table are dropped
+            if compare_cols:
+                common_cols_list = sorted(common_cols)
+                different_keys = keys.filter(in_t1 & in_t2 & has_key & (col("T1_DIGEST") != col("T2_DIGEST"))).select(*KEY_COLUMNS)
                 
-                # Find identical records (same values in ALL common columns)
-                identical_records = df1_common.intersect(df2_common)
-                identical_count = identical_records.count()                
-                total_records_t1 = df1_common.count()
-                total_records_t2 = df2_common.count()
+                def different_records(rows, other_rows):
+                    candidates = rows.join(different_keys, KEY_COLUMNS, "leftsemi")
+                    other_digests = other_rows.select(*KEY_COLUMNS, "ROW_DIGEST")
+                    return candidates.join(other_digests, KEY_COLUMNS + ["ROW_DIGEST"], "leftanti").select(*common_cols_list)
                 
-                # Calculate different records
-                different_t1_count = total_records_t1 - identical_count
-                different_t2_count = total_records_t2 - identical_count                
-                different_records_table1 = df1_common.subtract(identical_records)
-                different_records_table2 = df2_common.subtract(identical_records)
-                different_values_count = max(different_t1_count, different_t2_count)
-            else:
-                different_records_table1 = None
-                different_records_table2 = None
-                different_values_count = 0
-        
-        except Exception as e:
-            pass
+                different_records_table1 = different_records(rows1, rows2)
+                different_records_table2 = different_records(rows2, rows1)
+        else:  # If no key columns are specified, set the duplicate counts to -2 (for debugging purposes)
+            count1, count2, comparison_time = run_concurrently(df1.count, df2.count, lambda: comparison_time.collect()[0])
+            dup1_count = -2
+            dup2_count = -2 
 
         # total_issues count the difference in record number + missing and extra column 
         total_issues = 0
@@ -135,7 +299,7 @@ def main(session: sp.Session):
         try:
             # Create DQ_COMPARISON_SUMMARY_VIEW
             detailed_summary_data = [
-                ("COMPARISON_TIMESTAMP", str(session.sql("SELECT CURRENT_TIMESTAMP()").collect()[0][0])),
+                ("COMPARISON_TIMESTAMP", str(comparison_time[0])),
                 ("TABLE1_NAME", TABLE1),
                 ("TABLE2_NAME", TABLE2),
                 ("TABLE1_RECORDS", str(count1)),
@@ -149,90 +313,47 @@ def main(session: sp.Session):
                 ("DUPLICATE_GROUPS_T2", str(dup2_count) if 'dup2_count' in locals() else "0"),
                 ("MISSING_RECORDS_COUNT", str(missing_count) if 'missing_count' in locals() else "0"),
                 ("EXTRA_RECORDS_COUNT", str(extra_count) if 'extra_count' in locals() else "0"),
+                ("NULL_KEY_RECORDS_T1", str(null_key_count1)),
+                ("NULL_KEY_RECORDS_T2", str(null_key_count2)),
                 ("DIFFERENT_VALUES_COUNT", str(different_values_count) if 'different_values_count' in locals() else "0"),
                 ("TOTAL_ISSUES_FOUND", str(total_issues)),
                 ("OVERALL_STATUS", "PERFECT_MATCH" if total_issues == 0 else "DIFFERENCES_FOUND")
             ]            
+            if drill_down_levels is not None:
+                detailed_summary_data += [
+                    ("CHECKSUM_DRILL_DOWN_LEVELS", str(drill_down_levels)),
+                    ("RECORDS_COMPARED_BY_KEY", str(drill_down_records))
+                ]
             detailed_df = session.create_dataframe(detailed_summary_data, schema=["METRIC", "VALUE"])
-            detailed_df.create_or_replace_view("DEV_SILVER.DQ.DQ_COMPARISON_SUMMARY_VIEW")
             
-            # Create DQ_MISSING_RECORDS_VIEW - records in table1 missing in table2
-            if 'missing_in_2' in locals() and missing_in_2 is not None:
-                try:
-                    missing_in_2.create_or_replace_view("DEV_SILVER.DQ.DQ_MISSING_RECORDS_VIEW")
-                except Exception as e:
-                    pass
-            else:  #Create empty view
-                try:
-                    empty_df = session.create_dataframe([], schema=df1.schema)
-                    empty_df.create_or_replace_view("DEV_SILVER.DQ.DQ_MISSING_RECORDS_VIEW")
-                except Exception as e:
-                    pass
+            # Detail views: the results found above, or an empty view (just the header) for consistency
+            views = [
+                ("DQ_COMPARISON_SUMMARY_VIEW", detailed_df),
+                # Records in table1 missing in table2
+                ("DQ_MISSING_RECORDS_VIEW", missing_in_2 if missing_in_2 is not None else session.create_dataframe([], schema=df1.schema)),
+                # Records in table2 missing in table1
+                ("DQ_EXTRA_RECORDS_VIEW", extra_in_2 if extra_in_2 is not None else session.create_dataframe([], schema=df2.schema)),
+                # Records with the same keys but that have different values in other columns
+                ("DQ_DIFFERENT_VALUES_T1_VIEW", different_records_table1 if different_records_table1 is not None else session.create_dataframe([], schema=df1.schema)),
+                ("DQ_DIFFERENT_VALUES_T2_VIEW", different_records_table2 if different_records_table2 is not None else session.create_dataframe([], schema=df2.schema)),
+            ]
+            # Duplicate records in Table 1 and Table 2 (with their occurrence counts)
+            if dup1 is not None:
+                views.append(("DQ_TABLE1_DUPLICATES_VIEW", dup1 if dup1_count > 0 else dup1.limit(0)))
+            if dup2 is not None:
+                views.append(("DQ_TABLE2_DUPLICATES_VIEW", dup2 if dup2_count > 0 else dup2.limit(0)))
             
-            # Create DQ_EXTRA_RECORDS_VIEW - records in table2 missing in table1
-            if 'extra_in_2' in locals() and extra_in_2 is not None:
-                try:
-                    extra_in_2.create_or_replace_view("DEV_SILVER.DQ.DQ_EXTRA_RECORDS_VIEW")
-                except Exception as e:
-                    pass
-            else:
-                try: #Create empty view
-                    empty_df = session.create_dataframe([], schema=df2.schema)
-                    empty_df.create_or_replace_view("DEV_SILVER.DQ.DQ_EXTRA_RECORDS_VIEW")
-                except Exception as e:
-                    pass
-                
-            # Create DQ_DIFFERENT_VALUES_T1_VIEW - records with the same keys but that have different values in other columns
-            if 'different_records_table1' in locals() and different_records_table1 is not None:
-                try:
-                    different_records_table1.create_or_replace_view("DEV_SILVER.DQ.DQ_DIFFERENT_VALUES_T1_VIEW")
-                except Exception as e:
-                    pass
-            else: #Create empty view
-                try:
-                    empty_diff_df = session.create_dataframe([], schema=df1.schema)
-                    empty_diff_df.create_or_replace_view("DEV_SILVER.DQ.DQ_DIFFERENT_VALUES_T1_VIEW")
-                except Exception as e:
-                    pass
-
-            # Create DQ_DIFFERENT_VALUES_T2_VIEW - records with the same keys but that have different values in other columns  
-            if 'different_records_table2' in locals() and different_records_table2 is not None:
+            # Every view (and its result table) is independent of the others, so they are created concurrently
+            def create_view(view_name, df):
                 try:
-                    different_records_table2.create_or_replace_view("DEV_SILVER.DQ.DQ_DIFFERENT_VALUES_T2_VIEW")
+                    if view_name == "DQ_COMPARISON_SUMMARY_VIEW":
+                        df.create_or_replace_view(f"{RESULTS_SCHEMA}.{view_name}")
+                    else:
+                        publish(df, view_name)
                 except Exception as e:
                     pass
-            else: # Create empty view
-                try:
-                    empty_diff_df = session.create_dataframe([], schema=df2.schema)
-                    empty_diff_df.create_or_replace_view("DEV_SILVER.DQ.DQ_DIFFERENT_VALUES_T2_VIEW")
-                except Exception as e:
-                    pass
-
-            # Create DQ_TABLE1_DUPLICATES_VIEW - duplicate records in Table 1 
-            if 'dup1' in locals() and 'dup1_count' in locals() and dup1_count > 0: 
-                try: 
-                    dup1.create_or_replace_view("DEV_SILVER.DQ.DQ_TABLE1_DUPLICATES_VIEW")
-                except Exception as e:
-                    pass
-            else: # Create empty view
-                try:
-                    empty_dup_df = dup1.limit(0) # Just header
-                    empty_dup_df.create_or_replace_view("DEV_SILVER.DQ.DQ_TABLE1_DUPLICATES_VIEW")
-                except Exception as e:
-                    pass
-                
-            # Create DQ_TABLE2_DUPLICATES_VIEW - duplicate records in Table 2
-            if 'dup2' in locals() and 'dup2_count' in locals() and dup2_count > 0:
-                try:
-                    dup2.create_or_replace_view("DEV_SILVER.DQ.DQ_TABLE2_DUPLICATES_VIEW") 
-                except Exception as e:
-                    pass
-            else: # Create empty view
-                try:
-                    empty_dup_df = dup2.limit(0) # Just header
-                    empty_dup_df.create_or_replace_view("DEV_SILVER.DQ.DQ_TABLE2_DUPLICATES_VIEW")
-                except Exception as e:
-                    pass                
+            
+            run_concurrently(*[lambda view_name=view_name, df=df: create_view(view_name, df) for view_name, df in views])
         except Exception as view_error:
             pass
         
@@ -246,6 +367,8 @@ def main(session: sp.Session):
             ("EXTRA_COLUMNS_T2", str(len(extra_cols))),
             ("MISSING_RECORDS", str(missing_count) if 'missing_count' in locals() else "0"),
             ("EXTRA_RECORDS", str(extra_count) if 'extra_count' in locals() else "0"),
+            ("NULL_KEY_RECORDS_T1", str(null_key_count1)),
+            ("NULL_KEY_RECORDS_T2", str(null_key_count2)),
             ("DIFFERENT_VALUES", str(different_values_count) if 'different_values_count' in locals() else "0"),
             ("TOTAL_ISSUES", str(total_issues)),
             ("STATUS", "PERFECT_MATCH" if total_issues == 0 else "DIFFERENCES_FOUND")
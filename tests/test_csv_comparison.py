@@ -0,0 +1,233 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import csv_comparison
+
+
+def write_comparison_files(tmp_path, rows=600):
+    """Source and target CSV files sorted by employee_id, with duplicates, nulls, missing, extra and changed records"""
+    rng = np.random.default_rng(0)
+    source = pd.DataFrame({'employee_id': np.arange(rows), 'name': rng.choice(['ann', 'Bob', 'cy', None], rows),
+                           'age': rng.integers(20, 60, rows), 'salary': rng.random(rows).round(2)})
+    target = source.copy()
+    target.loc[::7, 'salary'] += 1
+    target.loc[::11, 'name'] = 'ANN'
+    target = target.drop(range(5, rows, 40))
+    target = pd.concat([target, pd.DataFrame({'employee_id': [rows, rows + 1], 'name': 'new', 'age': 30, 'salary': 1.0})])
+    source = pd.concat([source, source.iloc[[3, 50]], source.iloc[[10]].assign(age=99)])
+    target = pd.concat([target, target.iloc[[20]]])
+    
+    file1 = tmp_path / "source.csv"
+    file2 = tmp_path / "target.csv"
+    source.sort_values('employee_id', kind='stable').to_csv(file1, index=False)
+    target.sort_values('employee_id', kind='stable').to_csv(file2, index=False)
+    return str(file1), str(file2)
+
+def report_body(report):
+    """The report without its timestamp header"""
+    return report.split('\n', 3)[3]
+
+
+def test_incremental_comparison_reports_changed_mismatches(tmp_path):
+    state_file = str(tmp_path / "state.npz")
+    source = pd.DataFrame({'employee_id': [1, 2, 3], 'name': ['a', 'b', 'c'], 'z': ['x', 'y', 'z']})
+    target = pd.DataFrame({'employee_id': [1, 2, 3], 'name': ['a', 'b', 'c'], 'z': ['x', 'y', 'DIFFERENT']})
+    common_cols = ['employee_id', 'name', 'z']
+    
+    # The first run only saves the state
+    assert csv_comparison.incremental_value_comparison(source, target, common_cols, ['employee_id'], state_file) is None
+    
+    # Key 3 already mismatched; its target value changes again
+    target.loc[2, 'z'] = 'CHANGED'
+    lines = list(csv_comparison.incremental_value_comparison(source, target, common_cols, ['employee_id'], state_file))
+    
+    assert "  New mismatches: 0" in lines
+    assert "  Changed mismatches: 1" in lines
+    assert "    Target: 'CHANGED'" in lines
+    
+    # Nothing changed since: nothing is reported in detail
+    lines = list(csv_comparison.incremental_value_comparison(source, target, common_cols, ['employee_id'], state_file))
+    assert "  Changed mismatches: 0" in lines
+    assert not any("CHANGED" in line for line in lines)
+
+
+def test_quick_check_block_samples_of_reordered_files(tmp_path):
+    source = pd.DataFrame({'employee_id': range(20000), 'name': [f"name {i}" for i in range(20000)]})
+    file1 = tmp_path / "source.csv"
+    file2 = tmp_path / "target.csv"
+    source.to_csv(file1, index=False)
+    source.sample(frac=1, random_state=0).to_csv(file2, index=False)
+    
+    # Both files are larger than max_mb, so they are read in blocks holding different keys
+    output, estimates = csv_comparison.quick_csv_comparison(str(file1), str(file2), ['employee_id'], sample_rate=0.5, max_mb=0.1)
+    
+    assert estimates['missing_rate'] is None and estimates['extra_rate'] is None
+    assert estimates['mismatch_rate'][0] == 0.0
+    assert not estimates['count_gap']
+    # Missing/extra records could not be estimated, so the verdict is not "no differences"
+    assert not estimates['different'] and estimates['unknown']
+    assert "Verdict: INCONCLUSIVE" in output
+
+
+def test_quick_check_target_read_whole(tmp_path):
+    source = pd.DataFrame({'employee_id': range(20000), 'name': [f"name {i}" for i in range(20000)]})
+    file1 = tmp_path / "source.csv"
+    file2 = tmp_path / "target.csv"
+    source.to_csv(file1, index=False)
+    source.iloc[::2].to_csv(file2, index=False)
+    
+    # The source is read in blocks, the target (every other record) whole
+    output, estimates = csv_comparison.quick_csv_comparison(str(file1), str(file2), ['employee_id'], sample_rate=0.5, max_mb=0.2)
+    
+    low, high = estimates['missing_rate']
+    assert low < 0.5 < high
+    assert estimates['extra_rate'] is None
+    assert estimates['records1'][0] <= 20000 <= estimates['records1'][1] and estimates['records2'] == (10000, 10000)
+    assert estimates['count_gap'] and estimates['different']
+
+
+def test_declared_integer_column_with_nulls(tmp_path, monkeypatch):
+    file1 = tmp_path / "source.csv"
+    file2 = tmp_path / "target.csv"
+    file1.write_text("employee_id,age\n1,30\n2,40\n3,50\n")
+    file2.write_text("employee_id,age\n1,30\n2,\n3,50\n")
+    monkeypatch.setattr(csv_comparison, "COLUMN_SCHEMA", {'employee_id': 'int64', 'age': 'int64'})
+    
+    df = csv_comparison.parse_csv(str(file2), **csv_comparison.csv_read_options(str(file2)))
+    assert str(df['age'].dtype) == 'Int64' and df['age'].isna().sum() == 1
+    
+    report, _ = csv_comparison.enhanced_csv_comparison(str(file1), str(file2))
+    assert "Error reading files" not in report
+    assert "Data type mismatch in column 'age'" not in report
+    assert "Value mismatches in column 'age':" in report
+
+
+@pytest.mark.parametrize("mode", ["streaming", "spill", "presorted", "workers", "parallel_parser"])
+def test_mode_matches_in_memory_comparison(tmp_path, monkeypatch, mode):
+    file1, file2 = write_comparison_files(tmp_path)
+    report, error_records = csv_comparison.enhanced_csv_comparison(file1, file2)
+    
+    if mode == "streaming":
+        mode_report, mode_errors = csv_comparison.streaming_csv_comparison(file1, file2, chunk_rows=100)
+    elif mode == "spill":
+        mode_report, mode_errors = csv_comparison.streaming_csv_comparison(file1, file2, chunk_rows=100, spill_buckets=4,
+                                                                           spill_dir=str(tmp_path))
+    elif mode == "presorted":
+        mode_report, mode_errors = csv_comparison.presorted_csv_comparison(file1, file2, chunk_rows=100)
+    elif mode == "workers":
+        mode_report, mode_errors = csv_comparison.enhanced_csv_comparison(file1, file2, workers=2)
+    else:
+        monkeypatch.setattr(csv_comparison, "CSV_ENGINE", "parallel")
+        monkeypatch.setattr(csv_comparison, "PARSE_WORKERS", 2)
+        mode_report, mode_errors = csv_comparison.enhanced_csv_comparison(file1, file2)
+    
+    assert "Value mismatches in column 'salary':" in report
+    assert report_body(mode_report) == report_body(report)
+    pd.testing.assert_frame_equal(mode_errors.reset_index(drop=True), error_records.reset_index(drop=True))
+
+
+def test_report_truncation(tmp_path, monkeypatch):
+    file1, file2 = write_comparison_files(tmp_path)
+    _, all_errors = csv_comparison.enhanced_csv_comparison(file1, file2)
+    monkeypatch.setattr(csv_comparison, "REPORT_MAX_ENTRIES", 2)
+    report, _ = csv_comparison.enhanced_csv_comparison(file1, file2)
+    
+    # Every section lists at most two records, followed by the number left out
+    for section in report.split("\n\n"):
+        assert sum(line.startswith("  - ") for line in section.splitlines()) <= 2
+    assert "  ... 82 more entries not shown (84 in total)" in report.split("Value mismatches in column 'salary':")[1]
+    assert "  ... 13 more entries not shown (15 in total)" in report.split("Missing records in target (15):")[1]
+    
+    # Streaming mode gives the same report, keeping only the listed error records
+    streaming_report, streaming_errors = csv_comparison.streaming_csv_comparison(file1, file2, chunk_rows=100)
+    assert report_body(streaming_report) == report_body(report)
+    assert streaming_errors.attrs['totals'] == all_errors['error_type'].value_counts().to_dict()
+    assert (streaming_errors.groupby(['error_type', 'source_file']).size() <= 2).all()
+
+
+def test_distinct_sketch_error_bound():
+    values = pd.Series(np.random.default_rng(1).integers(0, 50000, 200000))
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    
+    sketch = csv_comparison.add_to_distinct_sketch(csv_comparison.new_distinct_sketch(), hashes)
+    exact = values.nunique()
+    assert abs(csv_comparison.distinct_estimate(sketch) - exact) <= 3 * csv_comparison.distinct_error(sketch) * exact
+    
+    # Sketches of two halves merge into the sketch of the whole
+    half1 = csv_comparison.add_to_distinct_sketch(csv_comparison.new_distinct_sketch(), hashes[:100000])
+    half2 = csv_comparison.add_to_distinct_sketch(csv_comparison.new_distinct_sketch(), hashes[100000:])
+    merged = csv_comparison.merge_distinct_sketches(half1, half2)
+    assert (merged['registers'] == sketch['registers']).all()
+
+
+def test_quantile_sketch_error_bound():
+    values = np.random.default_rng(2).normal(100, 15, 100000)
+    sketch = csv_comparison.new_quantile_sketch()
+    for chunk in np.array_split(values, 20):
+        csv_comparison.add_to_quantile_sketch(sketch, pd.Series(chunk))
+    
+    # Each quantile's rank is within the sketch's rank error; the moments are exact
+    ordered = np.sort(values)
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        rank = np.searchsorted(ordered, csv_comparison.sketch_quantile(sketch, q)) / len(values)
+        assert abs(rank - q) <= csv_comparison.quantile_rank_error(sketch)
+    stats = csv_comparison.sketch_describe(sketch)
+    assert stats['count'] == len(values) and stats['mean'] == pytest.approx(values.mean())
+
+
+def test_parse_cache_round_trip_and_invalidation(tmp_path, monkeypatch):
+    file1, _ = write_comparison_files(tmp_path)
+    cache_dir = str(tmp_path / "cache")
+    parsed = csv_comparison.read_csv_cached(file1, cache_dir=cache_dir)
+    
+    # Unchanged files come from the cache, also after a touch (found by content hash)
+    parse_csv = csv_comparison.parse_csv
+    def fail(*args, **kwargs):
+        raise AssertionError("parsed instead of read from the cache")
+    monkeypatch.setattr(csv_comparison, "parse_csv", fail)
+    pd.testing.assert_frame_equal(csv_comparison.read_csv_cached(file1, cache_dir=cache_dir), parsed)
+    os.utime(file1, ns=(0, 0))
+    pd.testing.assert_frame_equal(csv_comparison.read_csv_cached(file1, cache_dir=cache_dir), parsed)
+    
+    # A changed file is parsed again
+    monkeypatch.setattr(csv_comparison, "parse_csv", parse_csv)
+    with open(file1, "a") as f:
+        f.write("9999,zed,1,0.5\n")
+    changed = csv_comparison.read_csv_cached(file1, cache_dir=cache_dir)
+    assert len(changed) == len(parsed) + 1 and changed['name'].iloc[-1] == 'zed'
+
+
+def test_columnar_output(tmp_path):
+    file1, file2 = write_comparison_files(tmp_path)
+    mismatch_file = str(tmp_path / "mismatches.parquet")
+    _, error_records = csv_comparison.enhanced_csv_comparison(file1, file2, mismatch_file=mismatch_file)
+    
+    mismatches = pq.read_table(mismatch_file).to_pandas()
+    assert list(mismatches.columns) == ['employee_id', 'column', 'source_value', 'target_value', 'error_type']
+    assert (mismatches['column'] == 'salary').sum() == 84 and (mismatches['error_type'] == 'v').all()
+    first = mismatches[mismatches['column'] == 'salary'].iloc[0]
+    assert float(first['target_value']) == pytest.approx(float(first['source_value']) + 1)
+    
+    # Streaming mode writes the same table
+    streaming_file = str(tmp_path / "streaming_mismatches.parquet")
+    csv_comparison.streaming_csv_comparison(file1, file2, chunk_rows=100, mismatch_file=streaming_file)
+    pd.testing.assert_frame_equal(pq.read_table(streaming_file).to_pandas(), mismatches)
+    
+    errors_file = str(tmp_path / "errors.arrow")
+    csv_comparison.write_columnar(error_records, errors_file)
+    with pa.memory_map(errors_file) as source:
+        saved = pa.ipc.open_file(source).read_all().to_pandas()
+    pd.testing.assert_frame_equal(saved, error_records.reset_index(drop=True))
+
+
+def test_presorted_mode_detects_unsorted_input(tmp_path):
+    file1, file2 = write_comparison_files(tmp_path)
+    pd.read_csv(file2).sample(frac=1, random_state=0).to_csv(file2, index=False)
+    
+    with pytest.raises(ValueError, match="target.csv is not sorted"):
+        csv_comparison.presorted_csv_comparison(file1, file2, chunk_rows=100)
@@ -0,0 +1,156 @@
+import hashlib
+import re
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("snowflake.snowpark")
+from snowflake.snowpark import Row, Session
+from snowflake.snowpark.mock import ColumnEmulator, ColumnType, patch
+from snowflake.snowpark.types import DecimalType, DoubleType, LongType, StringType, StructField, StructType
+
+import snowflake_table_comparison
+
+VIEWS = ["DQ_COMPARISON_SUMMARY_VIEW", "DQ_MISSING_RECORDS_VIEW", "DQ_EXTRA_RECORDS_VIEW", "DQ_DIFFERENT_VALUES_T1_VIEW",
+         "DQ_DIFFERENT_VALUES_T2_VIEW", "DQ_TABLE1_DUPLICATES_VIEW", "DQ_TABLE2_DUPLICATES_VIEW"]
+
+
+# Local testing sessions do not implement HASH, HASH_AGG and ABS. They also store the sum of a column as a 64-bit
+# integer, so the mock hashes are 32-bit to keep the drill-down checksums (sums of row hashes) from overflowing
+def stable_hash(*values):
+    text = repr(tuple(None if pd.isna(value) else value for value in values))
+    return int.from_bytes(hashlib.md5(text.encode()).digest()[:4], "big", signed=True)
+
+@patch("hash")
+def mock_hash(*columns: ColumnEmulator) -> ColumnEmulator:
+    rows = pd.concat([column.reset_index(drop=True) for column in columns], axis=1).itertuples(index=False)
+    return ColumnEmulator(data=[stable_hash(*row) for row in rows], sf_type=ColumnType(LongType(), False))
+
+@patch("hash_agg")
+def mock_hash_agg(column: ColumnEmulator) -> int:
+    return sum(stable_hash(value) for value in column) % 2 ** 63
+
+@patch("abs")
+def mock_abs(column: ColumnEmulator) -> ColumnEmulator:
+    return ColumnEmulator(data=[abs(value) for value in column], sf_type=ColumnType(LongType(), False))
+
+
+def run_comparison(monkeypatch, max_concurrent_queries, table1=None, table2=None, drill_down_buckets=None):
+    """Compare two small tables in a local session (by default the tables below, else (rows, schema) pairs);
+    returns the summary rows and every view's rows"""
+    monkeypatch.setattr(snowflake_table_comparison, "KEY_COLUMNS", ["EMPLOYEE_ID"])
+    monkeypatch.setattr(snowflake_table_comparison, "MATERIALIZE_RESULTS", True)
+    monkeypatch.setattr(snowflake_table_comparison, "MAX_CONCURRENT_QUERIES", max_concurrent_queries)
+    monkeypatch.setattr(snowflake_table_comparison, "CHECKSUM_DRILL_DOWN", drill_down_buckets is not None)
+    monkeypatch.setattr(snowflake_table_comparison, "CHECKSUM_BUCKETS", drill_down_buckets or 64)
+    monkeypatch.setattr(snowflake_table_comparison, "CHECKSUM_ROW_LIMIT", 0)
+    session = Session.builder.config("local_testing", True).create()
+    try:
+        # Both tables hold the same keys: local sessions type COUNT(*) as non-nullable, so the result table of a
+        # FULL JOIN with unmatched keys cannot be saved
+        schema = ["EMPLOYEE_ID", "NAME", "SALARY"]
+        table1 = table1 or ([[1, "a", 10], [2, "b", 20], [3, "c", 30], [3, "c", 30], [4, "d", 40]], schema)
+        table2 = table2 or ([[1, "a", 10], [2, "B", 20], [3, "c", 30], [4, "d", 41]], schema)
+        session.create_dataframe(*table1).write.save_as_table('"your_database"."your_schema"."table1_name"')
+        session.create_dataframe(*table2).write.save_as_table('"your_database"."your_schema"."table2_name"')
+        
+        summary = snowflake_table_comparison.main(session).collect()
+        views = {}
+        for view in VIEWS:
+            rows = session.table(f"{snowflake_table_comparison.RESULTS_SCHEMA}.{view}").collect()
+            # The timestamp differs between runs
+            views[view] = sorted(map(str, (row for row in rows if row[0] != "COMPARISON_TIMESTAMP")))
+        return summary, views
+    finally:
+        session.close()
+
+
+def test_concurrent_run_matches_sequential_run(monkeypatch):
+    concurrent_summary, concurrent_views = run_comparison(monkeypatch, 8)
+    sequential_summary, sequential_views = run_comparison(monkeypatch, 1)
+    
+    assert concurrent_summary == sequential_summary
+    assert concurrent_views == sequential_views
+    
+    # Key 3 is duplicated in table1 with the same values, so it is a duplicate but not a value difference
+    summary = {row["METRIC"]: row["VALUE"] for row in concurrent_summary}
+    assert float(summary["DIFFERENT_VALUES"]) == 2
+    assert len(concurrent_views["DQ_DIFFERENT_VALUES_T1_VIEW"]) == float(summary["DIFFERENT_VALUES"])
+    assert len(concurrent_views["DQ_DIFFERENT_VALUES_T2_VIEW"]) == float(summary["DIFFERENT_VALUES"])
+    assert len(concurrent_views["DQ_TABLE1_DUPLICATES_VIEW"]) == 1
+
+
+def test_numbers_of_different_column_types_match(monkeypatch):
+    def schema(amount_type):
+        return StructType([StructField("EMPLOYEE_ID", LongType()), StructField("NAME", StringType()),
+                           StructField("AMOUNT", amount_type)])
+    
+    table1 = ([[1, "a", Decimal("1.50")], [2, "b", Decimal("2.25")], [3, "c", Decimal("3.00")]], schema(DecimalType(10, 2)))
+    table2 = ([[1, "a", 1.5], [2, "b", 2.25], [3, "c", 3.1]], schema(DoubleType()))
+    summary, views = run_comparison(monkeypatch, 1, table1, table2)
+    
+    summary = {row["METRIC"]: row["VALUE"] for row in summary}
+    assert float(summary["DIFFERENT_VALUES"]) == 1
+    assert views["DQ_DIFFERENT_VALUES_T1_VIEW"] == [str(Row(AMOUNT=Decimal("3.00"), EMPLOYEE_ID=3, NAME="c"))]
+
+
+def test_drill_down_matches_full_comparison(monkeypatch):
+    summary, views = run_comparison(monkeypatch, 1)
+    drill_down_summary, drill_down_views = run_comparison(monkeypatch, 1, drill_down_buckets=4)
+    
+    assert drill_down_summary == summary
+    for view in VIEWS[1:]:
+        assert drill_down_views[view] == views[view]
+    # The summary view also holds the drill-down metrics; the differences are found below the first level
+    levels = [row for row in drill_down_views["DQ_COMPARISON_SUMMARY_VIEW"] if "CHECKSUM_DRILL_DOWN_LEVELS" in row]
+    assert levels and "VALUE='0'" not in levels[0]
+
+
+class CleanupSession:
+    """Answers the SHOW statements of cleanup_results from a list of tables and views, and records the DROP statements"""
+    def __init__(self, tables, views):
+        self.objects = {"TABLES": tables, "VIEWS": views}
+        self.listed = {}
+        self.dropped = []
+    
+    def sql(self, query):
+        show = re.fullmatch(r"SHOW (TABLES|VIEWS) LIKE '((?:[^'\\]|\\.)*)' IN SCHEMA \S+", query)
+        if show:
+            # Unescape the string literal as Snowflake does, then match the names as LIKE does (\ escapes, case-insensitive)
+            pattern = re.sub(r"\\(.)", r"\1", show.group(2))
+            regex = "".join(re.escape(part[1]) if part.startswith("\\") else ".*" if part == "%" else "." if part == "_" else re.escape(part)
+                            for part in re.findall(r"\\.|.", pattern))
+            rows = [row for row in self.objects[show.group(1)] if re.fullmatch(regex, row["name"], re.IGNORECASE)]
+            self.listed[show.group(1)] = [row["name"] for row in rows]
+        else:
+            self.dropped.append(query)
+            rows = []
+        return SimpleNamespace(collect=lambda: rows)
+    
+    def create_dataframe(self, data, schema):
+        return data
+
+
+def test_cleanup_drops_expired_result_tables_and_their_views(monkeypatch):
+    monkeypatch.setattr(snowflake_table_comparison, "RESULTS_TTL_HOURS", 24)
+    now = datetime.now(timezone.utc)
+    old, new = now - timedelta(hours=30), now - timedelta(hours=1)
+    tables = [{"name": name, "created_on": created_on} for name, created_on in [
+        ("DQ_MISSING_RECORDS_VIEW_RESULT", old), ("DQ_DRILL_DOWN_L11_RESULT", old), ("DQ_DRILL_DOWN_L1_RESULT", new),
+        ("DQXMISSING_RECORDS_RESULT", old), ("DQ_MISSING_RECORDS_VIEW_RESULTS", old), ("OTHER_RESULT", old)]]
+    views = [{"name": "DQ_MISSING_RECORDS_VIEW", "text": "create view ... from DEV_SILVER.DQ.DQ_MISSING_RECORDS_VIEW_RESULT"},
+             {"name": "DQ_EXTRA_RECORDS_VIEW", "text": "create view ... semi join DEV_SILVER.DQ.DQ_DRILL_DOWN_L1_RESULT"}]
+    session = CleanupSession(tables, views)
+    
+    dropped = snowflake_table_comparison.cleanup_results(session)
+    
+    # The LIKE pattern only lists DQ_..._RESULT names: its underscores are literal
+    assert session.listed["TABLES"] == ["DQ_MISSING_RECORDS_VIEW_RESULT", "DQ_DRILL_DOWN_L11_RESULT", "DQ_DRILL_DOWN_L1_RESULT"]
+    assert dropped == [("VIEW", "DQ_MISSING_RECORDS_VIEW"), ("TABLE", "DQ_MISSING_RECORDS_VIEW_RESULT"),
+                       ("TABLE", "DQ_DRILL_DOWN_L11_RESULT")]
+    assert session.dropped == ['DROP VIEW IF EXISTS DEV_SILVER.DQ."DQ_MISSING_RECORDS_VIEW"',
+                               'DROP TABLE IF EXISTS DEV_SILVER.DQ."DQ_MISSING_RECORDS_VIEW_RESULT"',
+                               'DROP TABLE IF EXISTS DEV_SILVER.DQ."DQ_DRILL_DOWN_L11_RESULT"']